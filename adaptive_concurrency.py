@@ -0,0 +1,141 @@
+"""
+Adaptive concurrency limit: finds how much load a server takes at a
+latency target in a single run.
+
+The limiter stands in for a fixed concurrency. After each window of
+completed requests it compares the window's p95 time to first token with
+the target. Below the target the limit grows, doubling until the first
+overload and then by one request per window; above it, or when requests
+fail, the limit is cut by a constant factor (additive increase,
+multiplicative decrease, as in TCP congestion control). Only requests sent
+after the last change are judged, so every decision sees the effect of the
+limit it is judging.
+"""
+import asyncio
+import time
+
+from benchmark_stats import LogHistogram
+
+# TTFT percentile held at the target.
+ADAPTIVE_PERCENTILE = 95
+
+# Completed requests per adjustment window; a window also spans at least
+# one request per unit of the current limit.
+ADAPTIVE_MIN_SAMPLES = 20
+
+# Factor the limit is multiplied by when a window misses the target.
+ADAPTIVE_DECREASE = 0.8
+
+# The converged limit and throughput are averaged over this final share of
+# the windows.
+CONVERGED_SHARE = 0.5
+
+
+class AIMDLimiter:
+    """
+    Caps requests in flight at a limit between `min_limit` and `max_limit`
+    that adapts to hold the window's TTFT percentile at `target` seconds.
+    The sender awaits acquire() before each request and passes every
+    result to release(), or calls discard() for a request that failed
+    without one.
+    """
+
+    def __init__(self, target, max_limit, initial_limit=1, min_limit=1, percentile=ADAPTIVE_PERCENTILE,
+                 decrease=ADAPTIVE_DECREASE, min_samples=ADAPTIVE_MIN_SAMPLES):
+        self.target = target
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = max(min_limit, min(initial_limit, max_limit))
+        self.percentile = percentile
+        self.decrease = decrease
+        self.min_samples = min_samples
+        self.slow_start = True
+        self.in_flight = 0
+        self.ready = asyncio.Event()
+        self.start = self.last_change = time.time()
+        self.history = []
+        self._reset_window()
+
+    def _reset_window(self):
+        self.ttft = LogHistogram()
+        self.errors = 0
+        # Every completion since the last change, for the window's throughput.
+        self.completed = 0
+        self.completed_tokens = 0
+
+    async def acquire(self):
+        while self.in_flight >= self.limit:
+            self.ready.clear()
+            await self.ready.wait()
+        self.in_flight += 1
+
+    def release(self, result):
+        self.in_flight -= 1
+        self.completed += 1
+        if result['status'] == 'success':
+            self.completed_tokens += result['completion_tokens']
+        if result['start_time'] >= self.last_change:
+            if result['status'] == 'success':
+                self.ttft.record(result['time_to_first_token'])
+            else:
+                self.errors += 1
+            if self.ttft.count + self.errors >= max(self.min_samples, self.limit):
+                self._adjust()
+        self.ready.set()
+
+    def discard(self):
+        """Frees the slot of a request that ended without a result to judge."""
+        self.in_flight -= 1
+        self.ready.set()
+
+    def _adjust(self):
+        now = time.time()
+        seconds = now - self.last_change
+        ttft = self.ttft.percentile(self.percentile) if self.ttft.count else None
+        self.history.append({
+            "elapsed": now - self.start,
+            "limit": self.limit,
+            "ttft": ttft,
+            "errors": self.errors,
+            "requests_per_second": self.completed / seconds,
+            "tokens_per_second": self.completed_tokens / seconds,
+        })
+        if self.errors or ttft is None or ttft > self.target:
+            self.limit = max(self.min_limit, int(self.limit * self.decrease))
+            self.slow_start = False
+        elif self.slow_start:
+            self.limit = min(self.max_limit, self.limit * 2)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1)
+        self.last_change = now
+        self._reset_window()
+
+    def converged(self):
+        """Returns the windows the converged figures are averaged over (the last CONVERGED_SHARE)."""
+        return self.history[-max(1, int(len(self.history) * CONVERGED_SHARE)):] if self.history else []
+
+    def format_report(self):
+        """Returns (summary lines, per-window table lines)."""
+        label = f"p{self.percentile:g} TTFT"
+        summary = [f"Adaptive Concurrency: target {label} {self.target:.4f}s, limit capped at {self.max_limit}"]
+        windows = self.converged()
+        if not windows:
+            summary.append("Too few requests to complete an adjustment window.")
+            return summary, []
+        limits = [window['limit'] for window in windows]
+        summary += [
+            f"Converged Concurrency: {sum(limits) / len(limits):.1f} in flight "
+            f"(range {min(limits)}-{max(limits)} over the last {len(windows)} of {len(self.history)} windows)",
+            f"Throughput at Convergence: {sum(w['requests_per_second'] for w in windows) / len(windows):.2f} req/s, "
+            f"{sum(w['tokens_per_second'] for w in windows) / len(windows):.2f} output tok/s",
+            f"Final Limit: {self.limit}",
+        ]
+        if self.limit >= self.max_limit:
+            summary.append("Note: the limit reached its cap; raise -c to probe further.")
+
+        table = [f"{'Time':>8} {'Limit':>6} {label:>10} {'Errors':>6} {'Req/s':>8} {'Out tok/s':>10}"]
+        for window in self.history:
+            ttft = f"{window['ttft']:>9.4f}s" if window['ttft'] is not None else f"{'-':>10}"
+            table.append(f"{window['elapsed']:>7.1f}s {window['limit']:>6} {ttft} {window['errors']:>6} "
+                         f"{window['requests_per_second']:>8.2f} {window['tokens_per_second']:>10.2f}")
+        return summary, table
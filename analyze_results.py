@@ -0,0 +1,315 @@
+import argparse # For command-line arguments
+import json
+import math
+import os
+import sys
+
+from columnar_results import load_columns, np
+
+# Percentiles shown for every latency metric.
+REPORT_PERCENTILES = [50, 90, 99, 99.9]
+
+# Per-request columns summarized by the report, with their labels.
+LATENCY_COLUMNS = {
+    "time_to_first_token": "Time to First Token",
+    "time_per_output_token": "Time per Output Token",
+    "total_time": "End-to-End Latency",
+}
+
+# Metrics compared between runs: label and whether larger values are better.
+COMPARE_METRICS = {
+    "time_to_first_token": ("Time to First Token", False),
+    "inter_token_latency": ("Inter-Token Latency", False),
+    "total_time": ("End-to-End Latency", False),
+    "tokens_per_second": ("Tokens per Second", True),
+}
+
+# Defaults for the compare subcommand.
+COMPARE_PERCENTILES = [50, 99]
+REGRESSION_THRESHOLD = 0.05
+BOOTSTRAP_ITERATIONS = 1000
+CONFIDENCE = 0.95
+
+# Runs with more successful requests are randomly subsampled to this many
+# requests before bootstrapping.
+MAX_BOOTSTRAP_REQUESTS = 5000
+
+
+def was_streamed(columns):
+    """
+    Whether the run streamed its responses (older files without a mode are
+    taken to). Without streaming the first token arrives with the whole
+    response, so TTFT is only the end-to-end latency again and is left out.
+    """
+    header = json.loads(columns["run_header"].item()) if "run_header" in columns else {}
+    return (header.get("request_config") or {}).get("mode", "stream") == "stream"
+
+
+def select_rows(columns, category=None, start=None, end=None, backend=None):
+    """
+    Returns a boolean row mask for one category, one backend and/or a
+    start-offset window in seconds.
+    """
+    mask = np.ones(len(columns["success"]), dtype=bool)
+    for kind, value in (("category", category), ("backend", backend)):
+        if value is None:
+            continue
+        names = list(columns.get(f"{kind}_names", ()))
+        if value not in names:
+            raise SystemExit(f"Unknown {kind} '{value}'. Known: {', '.join(names)}")
+        mask &= columns[kind] == names.index(value)
+    if start is not None:
+        mask &= columns["start_offset"] >= start
+    if end is not None:
+        mask &= columns["start_offset"] < end
+    return mask
+
+
+def itl_for_rows(columns, mask):
+    """Returns every inter-token gap belonging to the selected rows."""
+    counts = np.diff(columns["itl_offsets"])
+    return columns["itl_values"][np.repeat(mask, counts)]
+
+
+def summarize_rows(columns, mask):
+    """Computes the aggregate metrics of the selected rows."""
+    ok = mask & columns["success"]
+    summary = {
+        "requests": int(mask.sum()),
+        "errors": int((mask & ~columns["success"]).sum()),
+        "completion_tokens": int(columns["completion_tokens"][ok].clip(min=0).sum()),
+    }
+    if ok.any():
+        starts = columns["start_offset"][ok]
+        span = float((starts + columns["total_time"][ok]).max() - starts.min())
+        summary["output_tps"] = summary["completion_tokens"] / span if span > 0 else 0.0
+        summary["request_rate"] = int(ok.sum()) / span if span > 0 else 0.0
+    metrics = {name: columns[name][ok] for name in LATENCY_COLUMNS
+               if name != "time_to_first_token" or was_streamed(columns)}
+    metrics["inter_token_latency"] = itl_for_rows(columns, ok)
+    for name, values in metrics.items():
+        values = values[~np.isnan(values)]
+        if values.size:
+            summary[name] = dict(zip(["mean"] + REPORT_PERCENTILES + ["max"],
+                                     [values.mean(), *np.percentile(values, REPORT_PERCENTILES), values.max()]))
+    return summary
+
+
+def format_summary(title, summary):
+    lines = [f"--- {title} ---",
+             f"Requests: {summary['requests']} ({summary['errors']} errors)"]
+    if "output_tps" in summary:
+        lines.append(f"Output Throughput: {summary['output_tps']:.2f} tok/s, "
+                     f"{summary['request_rate']:.2f} req/s")
+    lines.append(f"{'Metric':<22} {'mean':>10}" + "".join(f" {'p' + format(p, 'g'):>10}" for p in REPORT_PERCENTILES)
+                 + f" {'max':>10}")
+    labels = dict(LATENCY_COLUMNS, inter_token_latency="Inter-Token Latency")
+    for name, label in labels.items():
+        if name in summary:
+            lines.append(f"{label:<22}" + "".join(f" {value:>9.4f}s" for value in summary[name].values()))
+    return "\n".join(lines)
+
+
+def summarize_command(args):
+    columns = load_columns(args.run)
+    window = select_rows(columns, start=args.start, end=args.end, backend=args.backend)
+    categories = [args.category] if args.category else list(columns["category_names"])
+    sections = []
+    for category in categories:
+        mask = window & select_rows(columns, category=category)
+        sections.append(format_summary(category.replace('_', ' ').title(), summarize_rows(columns, mask)))
+    backends = list(columns.get("backend_names", ()))
+    if not args.category and not args.backend and len(backends) > 1:
+        for backend in sorted(backends):
+            mask = window & select_rows(columns, backend=backend)
+            sections.append(format_summary(f"Backend {backend}", summarize_rows(columns, mask)))
+    if not args.category:
+        sections.append(format_summary("Overall", summarize_rows(columns, window)))
+    print("\n\n".join(sections))
+
+
+def metric_samples(columns, mask, name):
+    """
+    Returns (values, offsets) for one metric over the selected successful
+    rows. Inter-token gaps come grouped per request, with request i's gaps at
+    values[offsets[i]:offsets[i + 1]]; per-request metrics have one value per
+    request and offsets None.
+    """
+    ok = mask & columns["success"]
+    if name == "inter_token_latency":
+        counts = np.diff(columns["itl_offsets"])[ok]
+        return itl_for_rows(columns, ok), np.concatenate([[0], np.cumsum(counts)])
+    values = columns[name][ok]
+    return values[~np.isnan(values)], None
+
+
+def take_requests(values, offsets, picks):
+    """Gathers the samples of the picked requests (see metric_samples)."""
+    if offsets is None:
+        return values[picks], None
+    counts = offsets[1:][picks] - offsets[:-1][picks]
+    first = np.cumsum(counts) - counts
+    positions = np.arange(counts.sum()) - np.repeat(first, counts)
+    picked_offsets = np.concatenate([[0], np.cumsum(counts)])
+    return values[np.repeat(offsets[:-1][picks], counts) + positions], picked_offsets
+
+
+def mann_whitney_p(a, b):
+    """Two-sided Mann-Whitney U test p-value, normal approximation with tie correction."""
+    n1, n2 = len(a), len(b)
+    combined = np.concatenate([a, b])
+    _, inverse, counts = np.unique(combined, return_inverse=True, return_counts=True)
+    # Average rank of each distinct value, then each sample's rank.
+    average_ranks = np.cumsum(counts) - (counts - 1) / 2.0
+    ranks = average_ranks[inverse]
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2.0
+    n = n1 + n2
+    tie_term = (counts ** 3 - counts).sum() / (n * (n - 1)) if n > 1 else 0.0
+    sigma = math.sqrt(n1 * n2 / 12.0 * ((n + 1) - tie_term))
+    if sigma == 0:
+        return 1.0
+    z = (u - n1 * n2 / 2.0) / sigma
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+def bootstrap_relative_deltas(base, candidate, percentiles, rng, iterations=BOOTSTRAP_ITERATIONS,
+                              confidence=CONFIDENCE):
+    """
+    Bootstraps the relative change of each percentile from `base` to
+    `candidate` (both (values, offsets) pairs from metric_samples) and
+    returns {pct: (low, high)} confidence intervals. Whole requests are
+    resampled, so that correlated inter-token gaps of one request are not
+    treated as independent samples.
+    """
+    def request_count(samples):
+        values, offsets = samples
+        return len(values) if offsets is None else len(offsets) - 1
+
+    def subsample(samples):
+        count = request_count(samples)
+        if count <= MAX_BOOTSTRAP_REQUESTS:
+            return samples
+        return take_requests(*samples, rng.choice(count, MAX_BOOTSTRAP_REQUESTS, replace=False))
+
+    base, candidate = subsample(base), subsample(candidate)
+    base_count, cand_count = request_count(base), request_count(candidate)
+    deltas = []
+    for _ in range(iterations):
+        base_values, _ = take_requests(*base, rng.integers(0, base_count, base_count))
+        cand_values, _ = take_requests(*candidate, rng.integers(0, cand_count, cand_count))
+        if not base_values.size or not cand_values.size:
+            continue
+        base_pct = np.percentile(base_values, percentiles)
+        cand_pct = np.percentile(cand_values, percentiles)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            deltas.append((cand_pct - base_pct) / base_pct)
+
+    tail = (1 - confidence) / 2 * 100
+    intervals = {}
+    for index, pct in enumerate(percentiles):
+        pct_deltas = np.array([delta[index] for delta in deltas])
+        pct_deltas = pct_deltas[np.isfinite(pct_deltas)]
+        if pct_deltas.size:
+            low, high = np.percentile(pct_deltas, [tail, 100 - tail])
+            intervals[pct] = (float(low), float(high))
+        else:
+            intervals[pct] = (math.nan, math.nan)
+    return intervals
+
+
+def compare_slice(base_columns, base_mask, cand_columns, cand_mask, args, rng):
+    """Compares one category (or the whole run) and returns (report lines, regression found)."""
+    lines = [f"{'Metric':<22} {'pct':>6} {'baseline':>10} {'candidate':>10} {'delta':>8} "
+             f"{format(args.confidence, '.0%') + ' CI':>18} {'MWU p':>8}  verdict"]
+    regressed = False
+    streamed = was_streamed(base_columns) and was_streamed(cand_columns)
+    for name, (label, higher_is_better) in COMPARE_METRICS.items():
+        if name == "time_to_first_token" and not streamed:
+            continue
+        base = metric_samples(base_columns, base_mask, name)
+        candidate = metric_samples(cand_columns, cand_mask, name)
+        if not base[0].size or not candidate[0].size:
+            continue
+        p_value = mann_whitney_p(base[0], candidate[0])
+        intervals = bootstrap_relative_deltas(base, candidate, args.percentiles, rng, args.bootstrap, args.confidence)
+        for pct in args.percentiles:
+            base_value = float(np.percentile(base[0], pct))
+            cand_value = float(np.percentile(candidate[0], pct))
+            delta = (cand_value - base_value) / base_value if base_value else math.nan
+            low, high = intervals[pct]
+            # Worse means slower latency or lower throughput; it only counts
+            # when the whole confidence interval is past the threshold's side of zero.
+            worse = -delta if higher_is_better else delta
+            significant = (high < 0) if higher_is_better else (low > 0)
+            verdict = "ok"
+            if worse > args.threshold and significant:
+                verdict = "REGRESSION"
+                regressed = True
+            elif worse < -args.threshold and ((low > 0) if higher_is_better else (high < 0)):
+                verdict = "improved"
+            unit = "" if higher_is_better else "s"
+            lines.append(
+                f"{label:<22} {'p' + format(pct, 'g'):>6} {base_value:>9.4f}{unit or ' '} {cand_value:>9.4f}{unit or ' '} "
+                f"{delta:>+8.1%} {f'[{low:+.1%}, {high:+.1%}]':>18} {p_value:>8.3g}  {verdict}"
+            )
+    return lines, regressed
+
+
+def compare_command(args):
+    rng = np.random.default_rng(args.seed)
+    baseline = load_columns(args.baseline)
+    regressions = []
+
+    for candidate_path in args.candidates:
+        candidate = load_columns(candidate_path)
+        print(f"=== {os.path.basename(candidate_path)} vs baseline {os.path.basename(args.baseline)} ===")
+        categories = [name for name in baseline["category_names"] if name in set(candidate["category_names"])]
+        slices = [(category.replace('_', ' ').title(),
+                   select_rows(baseline, category=category), select_rows(candidate, category=category))
+                  for category in categories]
+        slices.append(("Overall", select_rows(baseline), select_rows(candidate)))
+        for title, base_mask, cand_mask in slices:
+            lines, regressed = compare_slice(baseline, base_mask, candidate, cand_mask, args, rng)
+            print(f"--- {title} ---")
+            print("\n".join(lines))
+            print()
+            if regressed:
+                regressions.append(f"{os.path.basename(candidate_path)}: {title}")
+
+    if regressions:
+        print(f"Regression beyond {args.threshold:.0%} detected in: {', '.join(regressions)}")
+        sys.exit(1)
+    print("No significant regressions detected.")
+
+
+if __name__ == "__main__":
+    # Needs NumPy: pip install numpy
+    parser = argparse.ArgumentParser(description="Analyze stored benchmark runs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    summarize_parser = subparsers.add_parser("summarize", help="Re-aggregate one stored run.")
+    summarize_parser.add_argument("run", help="A *_columns.npz file or a *_records.jsonl log.")
+    summarize_parser.add_argument("--category", type=str, help="Only report this category.")
+    summarize_parser.add_argument("--backend", type=str, help="Only report requests sent to this backend.")
+    summarize_parser.add_argument("--start", type=float, help="Only requests sent at or after this many seconds into the run.")
+    summarize_parser.add_argument("--end", type=float, help="Only requests sent before this many seconds into the run.")
+    summarize_parser.set_defaults(handler=summarize_command)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare runs against a baseline; exits with status 1 on a significant regression.")
+    compare_parser.add_argument("baseline", help="The reference run (.npz or .jsonl).")
+    compare_parser.add_argument("candidates", nargs="+", help="One or more runs to compare against the baseline.")
+    compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                                help=f"Relative change that counts as a regression (default: {REGRESSION_THRESHOLD}).")
+    compare_parser.add_argument("--percentiles", type=lambda text: [float(p) for p in text.split(",")],
+                                default=COMPARE_PERCENTILES,
+                                help=f"Comma-separated percentiles to compare (default: {','.join(map(str, COMPARE_PERCENTILES))}).")
+    compare_parser.add_argument("--bootstrap", type=int, default=BOOTSTRAP_ITERATIONS,
+                                help=f"Bootstrap resamples per percentile (default: {BOOTSTRAP_ITERATIONS}).")
+    compare_parser.add_argument("--confidence", type=float, default=CONFIDENCE,
+                                help=f"Confidence level of the bootstrap interval (default: {CONFIDENCE}).")
+    compare_parser.add_argument("--seed", type=int, help="Seed for the bootstrap resampling.")
+    compare_parser.set_defaults(handler=compare_command)
+
+    args = parser.parse_args()
+    args.handler(args)
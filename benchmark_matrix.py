@@ -0,0 +1,237 @@
+"""
+Runs a matrix of benchmarks (e.g. models x max_tokens x concurrency x
+workload) described by one JSON file:
+
+    {
+        "settings": {"num_requests": 20, "warmup": 8},
+        "matrix": {
+            "model": ["org/model-a", "org/model-b"],
+            "max_tokens": [128, 512],
+            "concurrent_requests": [8, 32, 128],
+            "workload": ["prompts",
+                         {"name": "long-input", "workload": "synthetic", "input_lengths": "fixed:4096"}]
+        }
+    }
+
+Keys are summary_benchmark.py options in their long form without dashes
+(those in MATRIX_OPTIONS).
+"settings" apply to every cell; each "matrix" axis lists values, and a dict
+value sets several options at once (its optional "name" labels it in the
+report). Cells run back to back on shared connections. Every finished cell
+is cached under a hash of its resolved configuration, so an interrupted
+matrix resumes where it stopped and cells shared with an earlier matrix are
+not run again.
+"""
+import argparse # For command-line arguments
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+
+from benchmark_stats import BenchmarkStats
+from endpoint_pool import EndpointPool
+from summary_benchmark import (
+    COST_PER_HOUR, OUTPUT_FOLDER, build_arg_parser, build_load_config, build_request_config, build_slo,
+    cost_per_million_tokens, resolve_output_path, run_schedule, run_warmup, summarize_sweep_step,
+    write_results_to_file,
+)
+
+# --- Configuration (Default values) ---
+# Folder holding one JSON file per finished cell, named by its config hash.
+CACHE_FOLDER = os.path.join(OUTPUT_FOLDER, "matrix_cache")
+
+# Options a cell may set: those that shape its load, requests and SLO, all
+# of which are part of its cache key, plus its cost, which is only applied
+# when reporting (so a new cost reuses the cached measurements). Run-level
+# options (workers, agents, adaptive concurrency, sweeps, measurement
+# windows, response storage, live metrics, profiling) are
+# summary_benchmark.py features the matrix does not run.
+MATRIX_OPTIONS = {
+    "endpoints", "balancing", "model", "mode", "batch_size", "n", "max_tokens", "timeout", "tokenizer",
+    "num_requests", "concurrent_requests", "rate", "arrival", "burst_size", "trace", "time_scale",
+    "workload", "input_lengths", "output_lengths", "prefix_tokens", "hit_ratio", "turns", "seed",
+    "warmup", "warmup_seconds", "slo_ttft", "slo_latency", "slo_itl", "cost_per_hour",
+}
+
+# Seed for cells that do not set one. A fixed seed gives every cell the same
+# schedule, so models are compared on identical load, and keeps a cell's
+# cache key stable between runs.
+MATRIX_SEED = 0
+
+
+def expand_matrix(config):
+    """Returns a (labels, options) pair per cell, in the order the axes are listed."""
+    axes = config.get('matrix', {})
+    cells = []
+    for values in itertools.product(*axes.values()):
+        options = dict(config.get('settings', {}))
+        labels = {}
+        for axis, value in zip(axes, values):
+            if isinstance(value, dict):
+                value = dict(value)
+                name = value.pop('name', None)
+                labels[axis] = name if name is not None else \
+                    value.get(axis, ",".join(f"{key}={item}" for key, item in value.items()))
+                options.update(value)
+            else:
+                labels[axis] = value
+                options[axis] = value
+        cells.append((labels, options))
+    return cells
+
+
+def build_cell(labels, options):
+    """Resolves one cell's options into the configs summary_benchmark uses, plus its cache key."""
+    cli_args = build_arg_parser().parse_args([])
+    for key, value in options.items():
+        if not hasattr(cli_args, key):
+            raise SystemExit(f"Unknown option '{key}' in the matrix config.")
+        if key not in MATRIX_OPTIONS:
+            raise SystemExit(f"Option '{key}' is not supported in a matrix; run that cell with "
+                             f"summary_benchmark.py instead.")
+        setattr(cli_args, key, value)
+    if cli_args.seed is None:
+        cli_args.seed = MATRIX_SEED
+
+    load_config = build_load_config(cli_args)
+    request_config = build_request_config(cli_args)
+    slo = build_slo(cli_args)
+    key_source = json.dumps({"load_config": load_config, "request_config": request_config, "slo": slo},
+                            sort_keys=True)
+    return {
+        "labels": labels,
+        "load_config": load_config,
+        "request_config": request_config,
+        "slo": slo,
+        "cost_per_hour": cli_args.cost_per_hour if cli_args.cost_per_hour is not None else COST_PER_HOUR,
+        "key": hashlib.sha256(key_source.encode()).hexdigest()[:16],
+        # Cells with the same endpoints and timeout share one EndpointPool.
+        "pool": json.dumps([request_config['endpoints'], request_config['balancing'], request_config['timeout']]),
+    }
+
+
+async def run_cell(endpoints, cell):
+    """Runs one cell's warm-up and measured load and returns its summary and full report."""
+    load_config, request_config = cell['load_config'], cell['request_config']
+    await run_warmup(endpoints, load_config, request_config, load_config['concurrency'])
+    stats = BenchmarkStats(*cell['slo'])
+    start_time = time.monotonic()
+    await run_schedule(endpoints, load_config, request_config, stats, load_config['concurrency'])
+    elapsed_time = time.monotonic() - start_time
+    return {
+        "summary": summarize_sweep_step(stats, elapsed_time, load_config['concurrency']),
+        "report": stats.format_report(elapsed_time=elapsed_time),
+    }
+
+
+def save_cell(path, cell, result):
+    """Writes a finished cell to the cache; the rename keeps a crash from leaving half a file."""
+    record = {
+        "finished": datetime.now().isoformat(),
+        "load_config": cell['load_config'],
+        "request_config": cell['request_config'],
+        **result,
+    }
+    with open(path + ".tmp", "w") as f:
+        json.dump(record, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def format_matrix_report(cells, results, has_slo):
+    """Builds the table with one row per cell, with cost per million output tokens when a cost is set."""
+    axes = list(cells[0]['labels'])
+    widths = [max(len(axis), *(len(str(cell['labels'][axis])) for cell in cells)) for axis in axes]
+    header = " ".join(f"{axis:<{width}}" for axis, width in zip(axes, widths))
+    header += f" {'Reqs':>6} {'Errors':>6} {'Out tok/s':>10} {'TTFT p50':>9} {'TTFT p99':>9} {'Lat p99':>9}"
+    has_cost = any(cell['cost_per_hour'] is not None for cell in cells)
+    if has_cost:
+        header += f" {'$/1M out':>9}"
+    if has_slo:
+        header += f" {'Goodput':>8}  SLO"
+    lines = [header]
+    for cell, result in zip(cells, results):
+        step = result['summary']
+        row = " ".join(f"{str(cell['labels'][axis]):<{width}}" for axis, width in zip(axes, widths))
+        row += f" {step['requests']:>6} {step['errors']:>6} {step['output_tps']:>10.2f}"
+        for key in ("ttft_p50", "ttft_p99", "latency_p99"):
+            row += f" {step[key]:>8.4f}s" if step.get(key) is not None else f" {'-':>9}"
+        if has_cost:
+            cost = None
+            if cell['cost_per_hour'] is not None:
+                cost = cost_per_million_tokens(cell['cost_per_hour'], step['output_tps'])
+            row += f" {cost:>9.4f}" if cost is not None else f" {'-':>9}"
+        if has_slo:
+            row += f" {step['goodput']:>8.2f}  {'ok' if step['meets_slo'] else 'FAIL'}"
+        lines.append(row)
+    return "\n".join(lines)
+
+
+def cell_label(cell):
+    return ", ".join(f"{axis}={value}" for axis, value in cell['labels'].items())
+
+
+async def run_matrix(cli_args):
+    with open(cli_args.config) as f:
+        config = json.load(f)
+    cells = [build_cell(labels, options) for labels, options in expand_matrix(config)]
+    if not cells:
+        raise SystemExit("The matrix config has no cells.")
+    cache_folder = cli_args.cache_dir or CACHE_FOLDER
+    os.makedirs(cache_folder, exist_ok=True)
+    run_config = {
+        'output_path': resolve_output_path(cli_args.output_file),
+    }
+
+    print(f"--- Starting Benchmark Matrix: {len(cells)} cells ---")
+    results = [None] * len(cells)
+    cached = 0
+    for index, cell in enumerate(cells):
+        path = os.path.join(cache_folder, f"{cell['key']}.json")
+        if os.path.exists(path) and not cli_args.rerun:
+            with open(path) as f:
+                results[index] = json.load(f)
+            cached += 1
+    if cached:
+        print(f"{cached} cell(s) already finished, taken from '{cache_folder}'.")
+
+    # Consecutive cells on the same endpoints reuse one set of warm connections.
+    pending = [index for index, result in enumerate(results) if result is None]
+    for _, group in itertools.groupby(pending, key=lambda index: cells[index]['pool']):
+        group = list(group)
+        first = cells[group[0]]['request_config']
+        open_loop = any(cells[index]['load_config']['rate'] is not None or cells[index]['load_config']['trace']
+                        for index in group)
+        connection_limit = 0 if open_loop else max(cells[index]['load_config']['concurrency'] for index in group)
+        async with EndpointPool(first['endpoints'], first['balancing'], connection_limit,
+                                first['timeout']) as endpoints:
+            for index in group:
+                cell = cells[index]
+                print(f"\n[{index + 1}/{len(cells)}] {cell_label(cell)}")
+                results[index] = await run_cell(endpoints, cell)
+                save_cell(os.path.join(cache_folder, f"{cell['key']}.json"), cell, results[index])
+
+    has_slo = any(limit is not None for cell in cells for limit in cell['slo'])
+    table = format_matrix_report(cells, results, has_slo)
+    print("\n--- Matrix Complete ---")
+    print(table)
+    # The file also keeps each cell's full report.
+    details = [f"\n=== {cell_label(cell)} ===\n{result['report']}" for cell, result in zip(cells, results)]
+    write_results_to_file(table + "\n" + "\n".join(details) + "\n", run_config)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a cached matrix of benchmarks from a JSON config.")
+    parser.add_argument("config", type=str,
+                        help="JSON file with \"settings\" and \"matrix\" axes of summary_benchmark.py options.")
+    parser.add_argument("-o", "--output_file", type=str,
+                        help="Specify the output filename.")
+    parser.add_argument("--cache_dir", type=str,
+                        help=f"Folder of finished cells to resume from (default: {CACHE_FOLDER}).")
+    parser.add_argument("--rerun", action="store_true",
+                        help="Run every cell again, replacing its cached result.")
+
+    args = parser.parse_args()
+    asyncio.run(run_matrix(cli_args=args))
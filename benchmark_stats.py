@@ -0,0 +1,319 @@
+"""
+Fixed-memory latency statistics shared by the benchmark scripts.
+
+Every result is folded into log-bucketed histograms as soon as it lands, so
+memory stays constant no matter how many requests a run sends, and
+histograms from separate runs, categories or processes can be merged.
+"""
+import math
+from collections import Counter, defaultdict
+
+# Percentiles shown in every report.
+REPORT_PERCENTILES = (50, 90, 99, 99.9)
+
+# Steady-state detection splits a run into this many equal slices and keeps
+# the span of slices whose completion count is within STEADY_STATE_TOLERANCE
+# of the median slice. Runs with fewer than STEADY_STATE_MIN_REQUESTS
+# completions are reported whole.
+STEADY_STATE_SLICES = 20
+STEADY_STATE_TOLERANCE = 0.2
+STEADY_STATE_MIN_REQUESTS = 100
+
+# Per-request metrics tracked for each category and for the whole run,
+# mapped to their report label and unit.
+METRICS = {
+    "time_to_first_token": ("Time to First Token", "s"),
+    "inter_token_latency": ("Inter-Token Latency", "s"),
+    "time_per_output_token": ("Time per Output Token", "s"),
+    "max_stall": ("Max Decode Stall", "s"),
+    "total_time": ("End-to-End Latency", "s"),
+    "tokens_per_second": ("Tokens per Second", ""),
+    "prefill_tokens_per_second": ("Prefill Tokens/s", ""),
+    "decode_tokens_per_second": ("Decode Tokens/s", ""),
+}
+
+
+class LogHistogram:
+    """
+    Histogram with logarithmically sized buckets, in the spirit of HDR
+    histograms. Each bucket spans a fixed ratio of values, so any percentile
+    is reported within `relative_error` of the true sample, between
+    `min_value` and `max_value`. Values below `min_value` share one bucket.
+    """
+
+    def __init__(self, min_value=1e-6, max_value=1e5, relative_error=0.01):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.relative_error = relative_error
+        self.log_growth = math.log1p(2 * relative_error)
+        self.num_buckets = int(math.ceil(math.log(max_value / min_value) / self.log_growth)) + 1
+        self.counts = [0] * (self.num_buckets + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _bucket_index(self, value):
+        if value < self.min_value:
+            return 0
+        index = int(math.log(value / self.min_value) / self.log_growth) + 1
+        return min(index, self.num_buckets)
+
+    def _bucket_value(self, index):
+        if index == 0:
+            return self.min
+        # Geometric midpoint of the bucket.
+        return self.min_value * math.exp((index - 0.5) * self.log_growth)
+
+    def record(self, value):
+        """Adds one sample."""
+        self.counts[self._bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """Adds every sample of another histogram with the same layout."""
+        if (other.min_value, other.max_value, other.relative_error) != \
+                (self.min_value, self.max_value, self.relative_error):
+            raise ValueError("Cannot merge histograms with different bucket layouts.")
+        for index, bucket_count in enumerate(other.counts):
+            self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, pct):
+        """Returns the nearest-rank `pct`-th percentile (0 when empty)."""
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(pct / 100 * self.count))
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+
+
+def decode_metrics(chunk_times, completion_tokens):
+    """
+    Derives decode-phase timings for one request from the offsets of its
+    streamed content chunks: time per output token, the p50/p99 gap between
+    chunks and the longest stall. Returns an empty dict for single-chunk
+    responses.
+    """
+    if len(chunk_times) < 2:
+        return {}
+    gaps = sorted(later - earlier for earlier, later in zip(chunk_times, chunk_times[1:]))
+    return {
+        "time_per_output_token": (chunk_times[-1] - chunk_times[0]) / max(completion_tokens - 1, 1),
+        "itl_p50": gaps[max(0, math.ceil(0.50 * len(gaps)) - 1)],
+        "itl_p99": gaps[max(0, math.ceil(0.99 * len(gaps)) - 1)],
+        "max_stall": gaps[-1],
+    }
+
+
+def steady_state_window(finish_times, slices=STEADY_STATE_SLICES, tolerance=STEADY_STATE_TOLERANCE):
+    """
+    Finds where throughput has stabilized, given when each request finished
+    (seconds from the start of the measured run). Returns the (start, end) of the
+    span from the first to the last slice whose completion count is within
+    `tolerance` of the median slice, or None if there are too few requests
+    to tell.
+    """
+    if len(finish_times) < STEADY_STATE_MIN_REQUESTS:
+        return None
+    width = max(finish_times) / slices
+    if width <= 0:
+        return None
+    counts = [0] * slices
+    for finish_time in finish_times:
+        counts[min(max(int(finish_time / width), 0), slices - 1)] += 1
+    median = sorted(counts)[slices // 2]
+    stable = [abs(count - median) <= tolerance * median for count in counts]
+    first = stable.index(True)
+    last = slices - 1 - stable[::-1].index(True)
+    return first * width, (last + 1) * width
+
+
+def meets_slo(ttft, latency, itl, slo_ttft, slo_latency, slo_itl):
+    """
+    Checks a TTFT, end-to-end latency and p99 inter-token latency against
+    the limits that are set. A missing ITL (single-chunk response) passes.
+    """
+    if slo_ttft is not None and ttft > slo_ttft:
+        return False
+    if slo_latency is not None and latency > slo_latency:
+        return False
+    if slo_itl is not None and itl is not None and itl > slo_itl:
+        return False
+    return True
+
+
+class MetricSet:
+    """Histograms and counters for one slice of a run."""
+
+    def __init__(self):
+        self.histograms = {name: LogHistogram() for name in METRICS}
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.good_requests = 0
+        self.good_tokens = 0
+        # Successful requests whose response was streamed in chunks; time to
+        # first token is only measured for those.
+        self.streamed = 0
+        # Successful requests whose completion tokens were estimated (stream
+        # chunks or text length) rather than taken from usage or a tokenizer.
+        self.estimated_tokens = 0
+        # Failed requests by error type (exception class or HTTP status).
+        self.error_types = Counter()
+
+    @property
+    def successes(self):
+        return self.requests - self.errors
+
+    def add(self, result, good):
+        self.requests += 1
+        if result['status'] != 'success':
+            self.errors += 1
+            self.error_types[result.get('error_type') or 'unknown'] += 1
+            return
+        self.prompt_tokens += result.get('prompt_tokens') or 0
+        self.completion_tokens += result['completion_tokens']
+        self.cached_tokens += result.get('cached_tokens') or 0
+        if result.get('chunk_times'):
+            self.streamed += 1
+        if result.get('token_source') not in ("usage", "tokenizer"):
+            self.estimated_tokens += 1
+        if good:
+            self.good_requests += 1
+            self.good_tokens += result['completion_tokens']
+        for name, histogram in self.histograms.items():
+            if result.get(name) is not None:
+                histogram.record(result[name])
+        # Inter-token latency is tracked per chunk gap, not per request.
+        chunk_times = result.get('chunk_times') or ()
+        itl = self.histograms['inter_token_latency']
+        for earlier, later in zip(chunk_times, chunk_times[1:]):
+            itl.record(later - earlier)
+
+    def merge(self, other):
+        self.requests += other.requests
+        self.errors += other.errors
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.cached_tokens += other.cached_tokens
+        self.good_requests += other.good_requests
+        self.good_tokens += other.good_tokens
+        self.streamed += other.streamed
+        self.estimated_tokens += other.estimated_tokens
+        self.error_types.update(other.error_types)
+        for name, histogram in self.histograms.items():
+            histogram.merge(other.histograms[name])
+
+
+class BenchmarkStats:
+    """
+    Streams result dicts into per-category, per-backend and overall metric
+    sets. Successful requests that meet every optional SLO limit (TTFT,
+    end-to-end latency, the request's p99 inter-token latency) count
+    towards goodput.
+    """
+
+    def __init__(self, slo_ttft=None, slo_latency=None, slo_itl=None):
+        self.slo_ttft = slo_ttft
+        self.slo_latency = slo_latency
+        self.slo_itl = slo_itl
+        self.overall = MetricSet()
+        self.categories = defaultdict(MetricSet)
+        self.backends = defaultdict(MetricSet)
+        self.schedule_lag = LogHistogram()
+
+    def add(self, result):
+        """Folds one result dict into the statistics."""
+        good = result['status'] == 'success' and meets_slo(
+            result['time_to_first_token'], result['total_time'], result.get('itl_p99'),
+            self.slo_ttft, self.slo_latency, self.slo_itl
+        )
+        self.overall.add(result, good)
+        self.categories[result['category']].add(result, good)
+        if result.get('backend') is not None:
+            self.backends[result['backend']].add(result, good)
+        if result.get('schedule_lag') is not None:
+            self.schedule_lag.record(max(result['schedule_lag'], 0.0))
+
+    def merge(self, other):
+        """Adds the statistics collected by another BenchmarkStats."""
+        self.overall.merge(other.overall)
+        for category, metric_set in other.categories.items():
+            self.categories[category].merge(metric_set)
+        for backend, metric_set in other.backends.items():
+            self.backends[backend].merge(metric_set)
+        self.schedule_lag.merge(other.schedule_lag)
+
+    def combined(self, categories):
+        """Returns one MetricSet merging the named categories that were seen."""
+        metric_set = MetricSet()
+        for category in categories:
+            if category in self.categories:
+                metric_set.merge(self.categories[category])
+        return metric_set
+
+    @property
+    def has_slo(self):
+        return any(limit is not None for limit in (self.slo_ttft, self.slo_latency, self.slo_itl))
+
+    def format_report(self, percentiles=REPORT_PERCENTILES, elapsed_time=None):
+        """
+        Returns a percentile table for every category, every backend (when
+        there is more than one) and the whole run, with error and goodput
+        lines. Rates per second are shown when `elapsed_time` is given.
+        Time to first token is left out of sections without streamed
+        responses, where it would only repeat the end-to-end latency.
+        """
+        lines = []
+        sections = [(category.replace('_', ' ').title(), metric_set)
+                    for category, metric_set in self.categories.items()]
+        if len(self.backends) > 1:
+            sections += [(f"Backend {backend}", metric_set) for backend, metric_set in sorted(self.backends.items())]
+        sections.append(("Overall", self.overall))
+
+        header = f"{'Metric':<22} {'mean':>10}" + "".join(f" {'p' + format(p, 'g'):>10}" for p in percentiles) \
+            + f" {'max':>10}"
+        for title, metric_set in sections:
+            lines.append(f"--- {title} ---")
+            lines.append(f"Requests: {metric_set.requests} ({metric_set.errors} errors)")
+            tokens = f"Tokens: {metric_set.prompt_tokens} prompt, {metric_set.completion_tokens} completion"
+            if metric_set.cached_tokens:
+                tokens += f" ({metric_set.cached_tokens} prompt tokens served from cache)"
+            lines.append(tokens)
+            if metric_set.errors:
+                breakdown = ", ".join(f"{error_type} x{count}" for error_type, count in metric_set.error_types.most_common())
+                lines.append(f"Errors: {metric_set.errors / metric_set.requests:.1%} ({breakdown})")
+            if self.has_slo and metric_set.requests:
+                goodput = f"Goodput: {metric_set.good_requests} of {metric_set.requests} requests met the SLO " \
+                          f"({metric_set.good_requests / metric_set.requests:.1%})"
+                if elapsed_time:
+                    goodput += f", {metric_set.good_requests / elapsed_time:.2f} req/s, " \
+                               f"{metric_set.good_tokens / elapsed_time:.2f} tok/s"
+                lines.append(goodput)
+            lines.append(header)
+            for name, (label, unit) in METRICS.items():
+                histogram = metric_set.histograms[name]
+                if not histogram.count or (name == "time_to_first_token" and not metric_set.streamed):
+                    continue
+                values = [histogram.mean] + [histogram.percentile(p) for p in percentiles] + [histogram.max]
+                precision = 4 if unit == "s" else 2
+                lines.append((f"{label:<22}" + "".join(f" {value:>9.{precision}f}{unit or ' '}" for value in values)).rstrip())
+            lines.append("")
+        return "\n".join(lines).rstrip()
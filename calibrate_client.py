@@ -0,0 +1,153 @@
+"""
+Self-calibration of the benchmark client against the bundled mock server.
+
+The mock streams with a known TTFT and inter-token delay, so anything the
+client measures on top of those is overhead added by the client itself (plus
+loopback networking). The suite runs send_request at rising concurrency and
+reports, per level, the chunk rate achieved against the rate the mock's
+delays allow, and the TTFT and inter-token latency error. The fastest level
+that keeps within CALIBRATION_TOLERANCE of the ideal rate gives the client's
+maximum sustainable chunks/s (a lower bound if the mock itself saturates).
+"""
+import argparse # For command-line arguments
+import asyncio
+import multiprocessing
+import socket
+import time
+
+from benchmark_stats import BenchmarkStats
+from endpoint_pool import EndpointPool
+from mock_server import serve
+from summary_benchmark import resolve_output_path, run_closed_loop, write_results_to_file
+
+# --- Configuration (Default values) ---
+CALIBRATION_PORT = 8901
+
+# Mock server processes sharing the port, so the mock is not the bottleneck.
+MOCK_PROCESSES = 2
+
+# Delays the mock is configured with, in seconds, and tokens per response.
+CALIBRATION_TTFT = 0.05
+CALIBRATION_ITL = 0.005
+CALIBRATION_TOKENS = 100
+
+# Concurrency levels tried, and requests sent per in-flight slot at each level.
+CALIBRATION_LEVELS = [1, 4, 16, 64, 256]
+REQUESTS_PER_SLOT = 4
+
+# A level is sustainable while its chunk rate is within this fraction of the
+# ideal rate.
+CALIBRATION_TOLERANCE = 0.1
+
+
+def wait_for_port(port, timeout=10.0):
+    """Blocks until something accepts connections on localhost:`port`."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("localhost", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Mock server did not start on port {port}.")
+
+
+async def run_level(url, concurrency, request_config):
+    """Runs one concurrency level against the mock and returns its row of the report."""
+    num_requests = concurrency * REQUESTS_PER_SLOT
+    plan = (("calibration", i + 1, "Calibration request.") for i in range(num_requests))
+    stats = BenchmarkStats()
+    async with EndpointPool([(url, 1.0)], connection_limit=concurrency) as endpoints:
+        start_time = time.monotonic()
+        await run_closed_loop(endpoints, plan, concurrency, request_config, stats, num_requests,
+                              desc=f"Concurrency {concurrency}")
+        elapsed_time = time.monotonic() - start_time
+
+    overall = stats.overall
+    ttft = overall.histograms['time_to_first_token']
+    itl = overall.histograms['inter_token_latency']
+    # Chunks per second if every response took exactly the mock's delays.
+    ideal_rate = concurrency * CALIBRATION_TOKENS / (CALIBRATION_TTFT + (CALIBRATION_TOKENS - 1) * CALIBRATION_ITL)
+    return {
+        "concurrency": concurrency,
+        "errors": overall.errors,
+        "chunks_per_second": overall.completion_tokens / elapsed_time,
+        "efficiency": overall.completion_tokens / elapsed_time / ideal_rate,
+        "ttft_error_p50": ttft.percentile(50) - CALIBRATION_TTFT,
+        "ttft_error_p99": ttft.percentile(99) - CALIBRATION_TTFT,
+        "itl_error_p50": itl.percentile(50) - CALIBRATION_ITL,
+        "itl_error_p99": itl.percentile(99) - CALIBRATION_ITL,
+    }
+
+
+def format_calibration_report(rows):
+    """Builds the per-level table and the sustainable chunk rate."""
+    lines = [
+        f"Mock: TTFT {CALIBRATION_TTFT * 1000:g}ms, inter-token {CALIBRATION_ITL * 1000:g}ms, "
+        f"{CALIBRATION_TOKENS} tokens per response",
+        "",
+        f"{'Conc':>6} {'Errors':>6} {'Chunks/s':>10} {'of ideal':>9} {'TTFT err p50':>13} {'TTFT err p99':>13} "
+        f"{'ITL err p50':>12} {'ITL err p99':>12}",
+    ]
+    for row in rows:
+        lines.append(
+            f"{row['concurrency']:>6} {row['errors']:>6} {row['chunks_per_second']:>10.0f} {row['efficiency']:>9.1%} "
+            f"{row['ttft_error_p50'] * 1000:>11.2f}ms {row['ttft_error_p99'] * 1000:>11.2f}ms "
+            f"{row['itl_error_p50'] * 1000:>10.2f}ms {row['itl_error_p99'] * 1000:>10.2f}ms"
+        )
+    lines.append("")
+    sustainable = [row for row in rows if not row['errors'] and row['efficiency'] >= 1 - CALIBRATION_TOLERANCE]
+    if sustainable:
+        best = max(sustainable, key=lambda row: row['chunks_per_second'])
+        lines.append(f"Max Sustainable Chunk Rate: {best['chunks_per_second']:.0f} chunks/s "
+                     f"(concurrency {best['concurrency']})")
+    else:
+        lines.append("Max Sustainable Chunk Rate: below the lowest level tried")
+    lines.append(f"Client Overhead at Concurrency {rows[0]['concurrency']}: "
+                 f"TTFT {rows[0]['ttft_error_p50'] * 1000:+.2f}ms, inter-token {rows[0]['itl_error_p50'] * 1000:+.2f}ms (p50)")
+    return "\n".join(lines)
+
+
+async def run_calibration(cli_args):
+    levels = [int(level) for level in cli_args.levels.split(",")] if cli_args.levels else CALIBRATION_LEVELS
+    url = f"http://localhost:{CALIBRATION_PORT}/v1/chat/completions"
+    request_config = {
+        'model': "mock",
+        'mode': "stream",
+        'n': 1,
+        'max_tokens': CALIBRATION_TOKENS,
+        'tokenizer_path': None,
+        'capture_responses': False,
+        'profile': False,
+    }
+
+    context = multiprocessing.get_context("spawn")
+    servers = [context.Process(target=serve, daemon=True,
+                               args=(CALIBRATION_PORT, CALIBRATION_TTFT, CALIBRATION_ITL, 0.0, CALIBRATION_TOKENS,
+                                     True))
+               for _ in range(MOCK_PROCESSES)]
+    for server in servers:
+        server.start()
+    try:
+        await asyncio.to_thread(wait_for_port, CALIBRATION_PORT)
+        print("--- Starting Client Calibration ---\n")
+        rows = [await run_level(url, concurrency, request_config) for concurrency in levels]
+    finally:
+        for server in servers:
+            server.terminate()
+
+    summary_text = format_calibration_report(rows)
+    print("\n--- Calibration Complete ---")
+    print(summary_text)
+    write_results_to_file(summary_text, {'output_path': resolve_output_path(cli_args.output_file)})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the benchmark client's own overhead against a local mock server.")
+    parser.add_argument("-o", "--output_file", type=str,
+                        help="Specify the output filename.")
+    parser.add_argument("--levels", type=str,
+                        help=f"Comma-separated concurrency levels (default: {','.join(map(str, CALIBRATION_LEVELS))}).")
+
+    args = parser.parse_args()
+    asyncio.run(run_calibration(cli_args=args))
@@ -0,0 +1,104 @@
+"""
+Columnar storage of per-request results as a NumPy .npz archive.
+
+A run's JSONL log is converted into one array per field, so that a run of
+millions of requests can be loaded and re-sliced in seconds. Categories,
+backends and error types (exception class or HTTP status, as in the
+report's error breakdown) are stored as integer codes into small name
+tables; the free-form error messages stay in the JSONL log. The ragged
+per-request inter-token gaps are flattened into `itl_values`;
+request i's gaps are itl_values[itl_offsets[i]:itl_offsets[i + 1]].
+`start_offset` counts from the start of the measured part of the run, after
+any warm-up.
+"""
+import json
+import math
+from array import array
+
+from result_sink import read_records
+
+try:
+    # Optional: pip install numpy
+    import numpy as np
+except ImportError:
+    np = None
+
+# Float columns copied straight from each result; NaN marks a missing value.
+FLOAT_COLUMNS = (
+    "time_to_first_token", "total_time", "tokens_per_second", "schedule_lag",
+    "time_per_output_token", "max_stall", "prefill_tokens_per_second", "decode_tokens_per_second",
+)
+
+# Integer columns; -1 marks a missing value.
+INT_COLUMNS = ("request_num", "prompt_tokens", "completion_tokens", "cached_tokens")
+
+
+def require_numpy():
+    if np is None:
+        raise RuntimeError("Columnar results need NumPy: pip install numpy")
+
+
+def records_to_columns(header, results):
+    """Builds the column arrays from a run header and an iterable of result dicts."""
+    require_numpy()
+    category_codes, backend_codes, error_type_codes = {}, {}, {}
+    columns = {name: array('d') for name in FLOAT_COLUMNS + ("start_time",)}
+    columns.update({name: array('q') for name in INT_COLUMNS + ("category", "backend", "error_type")})
+    success = array('b')
+    itl_values = array('d')
+    itl_offsets = array('q', [0])
+
+    for result in results:
+        ok = result["status"] == "success"
+        success.append(ok)
+        columns["category"].append(category_codes.setdefault(result["category"], len(category_codes)))
+        backend = result.get("backend")
+        columns["backend"].append(-1 if backend is None else backend_codes.setdefault(backend, len(backend_codes)))
+        error_type = result.get("error_type") or "unknown"
+        columns["error_type"].append(-1 if ok else error_type_codes.setdefault(error_type, len(error_type_codes)))
+        for name in FLOAT_COLUMNS + ("start_time",):
+            value = result.get(name)
+            columns[name].append(value if value is not None else math.nan)
+        for name in INT_COLUMNS:
+            value = result.get(name)
+            columns[name].append(value if value is not None else -1)
+        chunk_times = result.get("chunk_times") or ()
+        itl_values.extend(later - earlier for earlier, later in zip(chunk_times, chunk_times[1:]))
+        itl_offsets.append(len(itl_values))
+
+    arrays = {name: np.frombuffer(values, dtype=np.float64 if values.typecode == 'd' else np.int64)
+              for name, values in columns.items()}
+    # The measured start is marked at the end of the log (see read_records);
+    # logs without it count from the run header.
+    run_start = header.get("measured", {}).get("start_time", header.get("start_time", 0.0))
+    arrays["start_offset"] = arrays.pop("start_time") - run_start
+    arrays["category"] = arrays["category"].astype(np.int16)
+    arrays["backend"] = arrays["backend"].astype(np.int16)
+    arrays["error_type"] = arrays["error_type"].astype(np.int16)
+    arrays["success"] = np.frombuffer(success, dtype=np.int8).astype(bool)
+    arrays["itl_values"] = np.frombuffer(itl_values, dtype=np.float64)
+    arrays["itl_offsets"] = np.frombuffer(itl_offsets, dtype=np.int64)
+    arrays["category_names"] = np.array(list(category_codes), dtype=str)
+    arrays["backend_names"] = np.array(list(backend_codes), dtype=str)
+    arrays["error_type_names"] = np.array(list(error_type_codes), dtype=str)
+    arrays["run_header"] = np.array(json.dumps(header))
+    return arrays
+
+
+def convert_records(jsonl_path, npz_path=None):
+    """Converts a JSONL result log into a compressed .npz file and returns its path."""
+    require_numpy()
+    npz_path = npz_path or jsonl_path.replace("_records.jsonl", "") + "_columns.npz"
+    header, results = read_records(jsonl_path)
+    np.savez_compressed(npz_path, **records_to_columns(header, results))
+    return npz_path
+
+
+def load_columns(path):
+    """Loads a .npz written by convert_records, or converts a JSONL log in memory."""
+    require_numpy()
+    if path.endswith(".jsonl"):
+        header, results = read_records(path)
+        return records_to_columns(header, results)
+    with np.load(path) as archive:
+        return {name: archive[name] for name in archive.files}
@@ -0,0 +1,378 @@
+"""
+Spreading one benchmark run over several load generators.
+
+Each load generator runs the same function (summary_benchmark.run_load,
+passed in as `load`) on its share of the request schedule: every Nth
+request and an even share of the concurrency. Results come back in
+RESULT_FIELDS order and are folded into the caller's statistics.
+
+  - Workers (--workers N) are processes on this machine. They send result
+    batches over a multiprocessing queue.
+  - Agents (--agent HOST:PORT) are processes on any machine that connect to
+    a coordinator (--agents N). They exchange newline-delimited JSON
+    messages with it over TCP.
+
+Either way, every share warms up on its own, then waits until all shares
+are warm before measuring, so the measured part starts together.
+"""
+import asyncio
+import json
+import multiprocessing
+import queue
+import socket
+import time
+
+from tqdm import tqdm
+
+from profiling import RunProfiler
+from result_sink import to_record
+
+# --- Configuration (Default values) ---
+# Seconds the parent waits after spawning workers before they all start
+# sending, so process start-up is not counted as load.
+WORKER_START_DELAY = 2.0
+
+# Results a worker or agent packs into each batch it sends back.
+WORKER_BATCH_SIZE = 100
+
+# Seconds between the coordinator handing out the schedule and the agents
+# starting to send, so every agent has received it and opened its sessions.
+AGENT_START_DELAY = 3.0
+
+# Seconds an agent keeps retrying to connect to a coordinator that is not
+# listening yet, and the seconds between its attempts.
+AGENT_CONNECT_TIMEOUT = 60.0
+AGENT_CONNECT_RETRY = 1.0
+
+# Longest message (one JSON line, e.g. a batch of results) accepted on the
+# coordinator connection, in bytes.
+AGENT_MESSAGE_LIMIT = 64 * 1024 * 1024
+
+# Results cross the process or network boundary as tuples in this field
+# order, to keep the records small.
+RESULT_FIELDS = (
+    "status", "category", "error", "time_to_first_token", "tokens_per_second", "total_time",
+    "prompt_tokens", "completion_tokens", "token_source", "prefill_tokens_per_second",
+    "decode_tokens_per_second", "chunk_times", "schedule_lag", "time_per_output_token",
+    "itl_p50", "itl_p99", "max_stall", "response", "request_num", "start_time", "cached_tokens", "backend",
+    "error_type", "phases", "request",
+)
+
+
+def pack_result(result):
+    return tuple(result.get(field) for field in RESULT_FIELDS)
+
+
+def unpack_result(record):
+    return dict(zip(RESULT_FIELDS, record))
+
+
+async def run_share(load, profiler, *args, **kwargs):
+    """Runs one load generator's share with `load`, under `profiler` when --profile is on."""
+    if profiler is not None:
+        profiler.start()
+    try:
+        await load(*args, **kwargs)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+
+
+# --- Multi-process load generation ---
+
+class QueueSink:
+    """Stands in for BenchmarkStats in a worker, batching packed results onto a queue."""
+
+    def __init__(self, result_queue, batch_size=WORKER_BATCH_SIZE, max_delay=0.5):
+        self.result_queue = result_queue
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.batch = []
+        self.last_flush = time.monotonic()
+
+    def add(self, result):
+        self.batch.append(pack_result(result))
+        if len(self.batch) >= self.batch_size or time.monotonic() - self.last_flush > self.max_delay:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            self.result_queue.put(self.batch)
+            self.batch = []
+        self.last_flush = time.monotonic()
+
+
+def worker_main(load, worker_index, num_workers, load_config, request_config, start_at, result_queue, go):
+    """
+    Entry point of a --workers process. After any warm-up it sends "warm"
+    and waits for the `go` event, so every worker starts measuring together.
+    Sends its profile (with --profile), then None once its share is done.
+    """
+    sink = QueueSink(result_queue)
+    profiler = RunProfiler() if request_config['profile'] else None
+
+    async def warmed_up():
+        if load_config['warmup_requests'] or load_config['warmup_seconds']:
+            result_queue.put("warm")
+            await asyncio.to_thread(go.wait)
+
+    asyncio.run(run_share(load, profiler, load_config, request_config, sink, worker_index, num_workers, start_at,
+                          show_progress=False, warmed_up=warmed_up))
+    sink.flush()
+    if profiler is not None:
+        result_queue.put({"profile": profiler.export()})
+    result_queue.put(None)
+
+
+def run_workers(load, num_workers, load_config, request_config, stats, total_requests, profiler=None):
+    """
+    Splits the run across `num_workers` processes and folds the result batches
+    they stream back into `stats`, and their profiles into `profiler`.
+    Returns (elapsed_time, measured_start), timed from the shared start.
+    """
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    go = context.Event()
+    start_at = time.time() + WORKER_START_DELAY
+    processes = [
+        context.Process(target=worker_main,
+                        args=(load, i, num_workers, load_config, request_config, start_at, result_queue, go))
+        for i in range(num_workers)
+    ]
+    for process in processes:
+        process.start()
+
+    finished = warm = 0
+    with tqdm(total=total_requests, desc="Running benchmark") as progress:
+        while finished < num_workers:
+            try:
+                batch = result_queue.get(timeout=1.0)
+            except queue.Empty:
+                if any(p.exitcode not in (None, 0) for p in processes):
+                    for process in processes:
+                        process.terminate()
+                    raise RuntimeError("A benchmark worker process exited with an error.")
+                continue
+            if batch is None:
+                finished += 1
+                continue
+            if batch == "warm":
+                # Measuring starts once every worker has finished its warm-up.
+                warm += 1
+                if warm == num_workers:
+                    start_at = time.time()
+                    go.set()
+                continue
+            if isinstance(batch, dict):
+                profiler.merge(batch['profile'])
+                continue
+            for record in batch:
+                stats.add(unpack_result(record))
+            progress.update(len(batch))
+
+    elapsed_time = time.time() - start_at
+    for process in processes:
+        process.join()
+    return elapsed_time, start_at
+
+
+# --- Distributed load generation ---
+# A coordinator (--agents N) and N agents (--agent HOST:PORT) exchange
+# newline-delimited JSON messages over TCP. Each agent is assigned a share of
+# the schedule exactly like a --workers process and streams its results back.
+
+def encode_message(message):
+    return json.dumps(message).encode() + b"\n"
+
+
+async def read_message(reader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by the other side.")
+    return json.loads(line)
+
+
+async def send_message(writer, message):
+    """Writes one message and waits until the connection has taken it."""
+    writer.write(encode_message(message))
+    await writer.drain()
+
+
+class SocketSink:
+    """
+    Stands in for BenchmarkStats in an agent, batching packed results onto
+    the coordinator connection. Batches are sent by a background task that
+    waits for each write to drain, so a slow coordinator holds results in
+    this process instead of growing the socket buffer; call close() to send
+    the rest.
+    """
+
+    def __init__(self, writer, clock_offset=0.0, batch_size=WORKER_BATCH_SIZE, max_delay=0.5):
+        self.writer = writer
+        self.clock_offset = clock_offset
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.batch = []
+        self.last_flush = time.monotonic()
+        self.sent = 0
+        self.outbox = asyncio.Queue()
+        self.sender = asyncio.create_task(self._send())
+
+    def add(self, result):
+        record = to_record(result)
+        if record.get('start_time') is not None:
+            # Start times are reported on the coordinator's clock.
+            record['start_time'] += self.clock_offset
+        self.batch.append(pack_result(record))
+        if len(self.batch) >= self.batch_size or time.monotonic() - self.last_flush > self.max_delay:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            self.outbox.put_nowait(self.batch)
+            self.batch = []
+        self.last_flush = time.monotonic()
+
+    async def _send(self):
+        while True:
+            batch = await self.outbox.get()
+            if batch is None:
+                return
+            await send_message(self.writer, {"type": "results", "batch": batch})
+            self.sent += len(batch)
+
+    async def close(self):
+        """Sends the pending batches and waits until they are written."""
+        self.flush()
+        self.outbox.put_nowait(None)
+        await self.sender
+
+
+async def connect_to_coordinator(host, port):
+    """
+    Opens the connection to the coordinator, retrying every
+    AGENT_CONNECT_RETRY seconds for up to AGENT_CONNECT_TIMEOUT seconds, so
+    agents may be started before it.
+    """
+    deadline = time.monotonic() + AGENT_CONNECT_TIMEOUT
+    waiting = False
+    while True:
+        try:
+            return await asyncio.open_connection(host, port, limit=AGENT_MESSAGE_LIMIT)
+        except OSError as e:
+            if time.monotonic() + AGENT_CONNECT_RETRY > deadline:
+                raise ConnectionError(f"No coordinator at {host}:{port} after {AGENT_CONNECT_TIMEOUT:g}s: {e}")
+            if not waiting:
+                print(f"Waiting for the coordinator at {host}:{port}...")
+                waiting = True
+            await asyncio.sleep(AGENT_CONNECT_RETRY)
+
+
+async def run_agent(load, address):
+    """
+    Connects to the coordinator at `address` (HOST:PORT), runs the share of
+    the load it is assigned and streams the results back.
+    """
+    host, _, port = address.rpartition(":")
+    reader, writer = await connect_to_coordinator(host or "localhost", int(port))
+    try:
+        await send_message(writer, {"type": "hello", "host": socket.gethostname()})
+        assignment = await read_message(reader)
+        # How far the coordinator's clock is ahead of ours (network delay ignored).
+        clock_offset = assignment['now'] - time.time()
+        load_config = assignment['load_config']
+        agent_index, num_agents = assignment['agent_index'], assignment['num_agents']
+        print(f"Agent {agent_index + 1} of {num_agents}: running its share of the load "
+              f"(clock offset {clock_offset * 1000:+.1f}ms)...")
+        sink = SocketSink(writer, clock_offset)
+        profiler = RunProfiler() if assignment['request_config']['profile'] else None
+
+        async def warmed_up():
+            if load_config['warmup_requests'] or load_config['warmup_seconds']:
+                await send_message(writer, {"type": "warm"})
+                await read_message(reader)
+
+        try:
+            await run_share(load, profiler, load_config, assignment['request_config'], sink, agent_index,
+                            num_agents, assignment['start_at'] - clock_offset, show_progress=False,
+                            warmed_up=warmed_up)
+        except Exception as e:
+            await send_message(writer, {"type": "error", "error": f"{type(e).__name__}: {e}"})
+            raise
+        finally:
+            await sink.close()
+        if profiler is not None:
+            await send_message(writer, {"type": "profile", "profile": profiler.export()})
+        await send_message(writer, {"type": "done"})
+        print(f"Agent {agent_index + 1} of {num_agents}: done, {sink.sent} results sent.")
+    finally:
+        writer.close()
+
+
+async def run_agents(num_agents, port, load_config, request_config, stats, total_requests, profiler=None):
+    """
+    Waits for `num_agents` agents to connect on `port`, hands each its share
+    of the schedule with a common start time, and folds the result batches
+    they stream back into `stats`, and their profiles into `profiler`.
+    Returns (elapsed_time, measured_start), timed from the shared start on
+    this machine's clock.
+    """
+    connected = asyncio.Queue()
+    finished = asyncio.Event()
+
+    async def accept(reader, writer):
+        await connected.put((reader, writer))
+        # Keep the connection open until the run is over.
+        await finished.wait()
+
+    server = await asyncio.start_server(accept, port=port, limit=AGENT_MESSAGE_LIMIT)
+    agents = []
+    try:
+        print(f"Waiting for {num_agents} agent(s) on port {port}...")
+        while len(agents) < num_agents:
+            reader, writer = await connected.get()
+            hello = await read_message(reader)
+            agents.append((reader, writer))
+            print(f"Agent {len(agents)} of {num_agents} connected from {hello['host']}.")
+
+        start_at = time.time() + AGENT_START_DELAY
+        warm = 0
+        for agent_index, (_, writer) in enumerate(agents):
+            await send_message(writer, {
+                "type": "assign", "agent_index": agent_index, "num_agents": num_agents,
+                "load_config": load_config, "request_config": request_config,
+                "start_at": start_at, "now": time.time(),
+            })
+
+        async def collect(agent_index, reader, progress):
+            nonlocal start_at, warm
+            while True:
+                try:
+                    message = await read_message(reader)
+                except ConnectionError:
+                    raise RuntimeError(f"Agent {agent_index + 1} disconnected before finishing.")
+                if message['type'] == "results":
+                    for record in message['batch']:
+                        stats.add(unpack_result(record))
+                    progress.update(len(message['batch']))
+                elif message['type'] == "warm":
+                    # Measuring starts once every agent has finished its warm-up.
+                    warm += 1
+                    if warm == num_agents:
+                        start_at = time.time()
+                        await asyncio.gather(*(send_message(writer, {"type": "go"}) for _, writer in agents))
+                elif message['type'] == "profile":
+                    profiler.merge(message['profile'])
+                elif message['type'] == "error":
+                    raise RuntimeError(f"Agent {agent_index + 1} failed: {message['error']}")
+                elif message['type'] == "done":
+                    return
+
+        with tqdm(total=total_requests, desc="Running benchmark") as progress:
+            await asyncio.gather(*(collect(i, reader, progress) for i, (reader, _) in enumerate(agents)))
+        return time.time() - start_at, start_at
+    finally:
+        finished.set()
+        for _, writer in agents:
+            writer.close()
+        server.close()
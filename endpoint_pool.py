@@ -0,0 +1,105 @@
+"""
+Load balancing over several OpenAI-compatible endpoints.
+
+Each endpoint gets its own aiohttp session, so connections are pooled per
+host, and the pool picks an endpoint for every request by round-robin,
+fewest outstanding requests, or a weighted split. In multi-process runs every
+worker balances its own share of the load independently.
+"""
+from urllib.parse import urlsplit
+
+import aiohttp
+
+# Supported ways of choosing the endpoint for the next request.
+BALANCING_POLICIES = ("round_robin", "least_outstanding", "weighted")
+
+
+def parse_endpoints(spec):
+    """
+    Parses a comma-separated list of endpoint URLs, each optionally followed
+    by `=WEIGHT`, into a list of (url, weight) pairs.
+    """
+    endpoints = []
+    for item in spec.split(","):
+        item = item.strip()
+        url, sep, weight = item.rpartition("=")
+        try:
+            endpoints.append((url, float(weight)) if sep else (item, 1.0))
+        except ValueError:
+            endpoints.append((item, 1.0))
+    if not endpoints or any(weight <= 0 for _, weight in endpoints):
+        raise ValueError(f"Invalid endpoint list: '{spec}'")
+    return endpoints
+
+
+class Endpoint:
+    """One backend: its URL, report name, session and in-flight request count."""
+
+    def __init__(self, url, weight, name):
+        self.url = url
+        self.weight = weight
+        self.name = name
+        self.session = None
+        self.outstanding = 0
+        self.current_weight = 0.0
+
+
+class EndpointPool:
+    """
+    Chooses an endpoint per request. Use as an async context manager; each
+    endpoint's connector is limited to `connection_limit` connections (0 for
+    no limit), `request_timeout` (seconds) caps every request, and
+    `trace_configs` are attached to every session.
+    """
+
+    def __init__(self, endpoints, policy="round_robin", connection_limit=100, request_timeout=None,
+                 trace_configs=None):
+        if policy not in BALANCING_POLICIES:
+            raise ValueError(f"Unknown balancing policy '{policy}'")
+        hosts = [urlsplit(url).netloc for url, _ in endpoints]
+        # Endpoints are reported by host, or by full URL when hosts repeat.
+        self.endpoints = [Endpoint(url, weight, host if hosts.count(host) == 1 else url)
+                          for (url, weight), host in zip(endpoints, hosts)]
+        self.policy = policy
+        self.connection_limit = connection_limit
+        self.request_timeout = request_timeout
+        self.trace_configs = trace_configs
+        self.next_index = 0
+
+    async def __aenter__(self):
+        options = {'trace_configs': self.trace_configs}
+        if self.request_timeout is not None:
+            options['timeout'] = aiohttp.ClientTimeout(total=self.request_timeout)
+        for endpoint in self.endpoints:
+            endpoint.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.connection_limit),
+                                                     **options)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        for endpoint in self.endpoints:
+            await endpoint.session.close()
+
+    def acquire(self):
+        """Picks the endpoint for the next request and counts it as outstanding."""
+        if self.policy == "least_outstanding":
+            # Ties go to the endpoint after the last one picked.
+            count = len(self.endpoints)
+            order = [self.endpoints[(self.next_index + i) % count] for i in range(count)]
+            endpoint = min(order, key=lambda e: e.outstanding)
+            self.next_index = (self.endpoints.index(endpoint) + 1) % count
+        elif self.policy == "weighted":
+            # Smooth weighted round-robin: spreads each endpoint's turns evenly.
+            total = sum(e.weight for e in self.endpoints)
+            for e in self.endpoints:
+                e.current_weight += e.weight
+            endpoint = max(self.endpoints, key=lambda e: e.current_weight)
+            endpoint.current_weight -= total
+        else:
+            endpoint = self.endpoints[self.next_index]
+            self.next_index = (self.next_index + 1) % len(self.endpoints)
+        endpoint.outstanding += 1
+        return endpoint
+
+    def release(self, endpoint):
+        """Marks a request to `endpoint` as finished."""
+        endpoint.outstanding -= 1
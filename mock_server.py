@@ -0,0 +1,144 @@
+"""
+Local mock of an OpenAI-compatible chat completions server.
+
+It streams one token per SSE chunk with a configurable time to first token,
+inter-token delay and jitter, and returns a usage block, so the benchmarks
+can be exercised (and calibrated) with no GPU or network. Non-streaming
+requests, `n` > 1 and multi-prompt /v1/completions batches are answered
+after the time the whole generation would take, as if batched together:
+
+    python3 mock_server.py --port 8001 --ttft 0.05 --itl 0.01 --jitter 0.1
+"""
+import argparse # For command-line arguments
+import asyncio
+import json
+import random
+import time
+from contextlib import nullcontext
+
+from aiohttp import web
+
+# --- Configuration (Default values) ---
+MOCK_PORT = 8001
+
+# Seconds before the first chunk and between chunks.
+MOCK_TTFT = 0.05
+MOCK_ITL = 0.01
+
+# Each delay is scaled by a random factor in [1 - JITTER, 1 + JITTER].
+MOCK_JITTER = 0.0
+
+# Tokens generated when a request sets no max_tokens.
+MOCK_OUTPUT_TOKENS = 100
+
+# Requests generated at once; further requests queue for a slot, so TTFT
+# grows with load like on a saturated server. None serves every request
+# immediately.
+MOCK_CAPACITY = None
+
+CHUNK_TEXT = "tok "
+
+
+def prompt_token_count(body):
+    """Approximates prompt tokens as the number of words in the messages."""
+    return sum(len(str(m.get('content', '')).split()) for m in body.get('messages', []))
+
+
+def create_app(ttft=MOCK_TTFT, itl=MOCK_ITL, jitter=MOCK_JITTER, output_tokens=MOCK_OUTPUT_TOKENS,
+               capacity=MOCK_CAPACITY):
+    """Builds the aiohttp application serving POST /v1/chat/completions and /v1/completions."""
+    slots = asyncio.Semaphore(capacity) if capacity else nullcontext()
+
+    def delay(seconds):
+        return seconds * random.uniform(1 - jitter, 1 + jitter) if jitter else seconds
+
+    def make_usage(prompt_tokens, completion_tokens):
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    async def generate(tokens):
+        async with slots:
+            await asyncio.sleep(delay(ttft) + sum(delay(itl) for _ in range(tokens - 1)))
+
+    async def chat_completions(request):
+        body = await request.json()
+        tokens = body.get('max_tokens') or output_tokens
+        choices = body.get('n') or 1
+        usage = make_usage(prompt_token_count(body), tokens * choices)
+
+        if not body.get('stream'):
+            await generate(tokens)
+            return web.json_response({
+                "object": "chat.completion",
+                "model": body.get('model'),
+                "choices": [{"index": i, "message": {"role": "assistant", "content": CHUNK_TEXT * tokens},
+                             "finish_reason": "length"} for i in range(choices)],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        chunk = b"data: " + json.dumps({
+            "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {"content": CHUNK_TEXT}}],
+        }).encode() + b"\n\n"
+        async with slots:
+            # Chunks follow a schedule from the start of generation, so a busy
+            # event loop shows up as lateness rather than drifting the cadence.
+            due = time.monotonic() + delay(ttft)
+            for i in range(tokens):
+                await asyncio.sleep(max(0.0, due - time.monotonic()))
+                await response.write(chunk)
+                due += delay(itl)
+        if (body.get('stream_options') or {}).get('include_usage'):
+            await response.write(b"data: " + json.dumps({"choices": [], "usage": usage}).encode() + b"\n\n")
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def completions(request):
+        body = await request.json()
+        prompts = body.get('prompt') or [""]
+        prompts = [prompts] if isinstance(prompts, str) else prompts
+        tokens = body.get('max_tokens') or output_tokens
+        choices = body.get('n') or 1
+        await generate(tokens)
+        return web.json_response({
+            "object": "text_completion",
+            "model": body.get('model'),
+            "choices": [{"index": i, "text": CHUNK_TEXT * tokens, "finish_reason": "length"}
+                        for i in range(len(prompts) * choices)],
+            "usage": make_usage(sum(len(prompt.split()) for prompt in prompts), tokens * len(prompts) * choices),
+        })
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/v1/completions", completions)
+    return app
+
+
+def serve(port=MOCK_PORT, ttft=MOCK_TTFT, itl=MOCK_ITL, jitter=MOCK_JITTER, output_tokens=MOCK_OUTPUT_TOKENS,
+          reuse_port=False, capacity=MOCK_CAPACITY):
+    """Runs the mock until interrupted. With `reuse_port` several processes can share the port."""
+    web.run_app(create_app(ttft, itl, jitter, output_tokens, capacity), host="localhost", port=port,
+                reuse_port=reuse_port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI-compatible streaming chat server.")
+    parser.add_argument("--port", type=int, default=MOCK_PORT,
+                        help=f"Port to listen on (default: {MOCK_PORT}).")
+    parser.add_argument("--ttft", type=float, default=MOCK_TTFT,
+                        help=f"Seconds before the first chunk (default: {MOCK_TTFT}).")
+    parser.add_argument("--itl", type=float, default=MOCK_ITL,
+                        help=f"Seconds between chunks (default: {MOCK_ITL}).")
+    parser.add_argument("--jitter", type=float, default=MOCK_JITTER,
+                        help=f"Relative random variation of every delay, e.g. 0.1 (default: {MOCK_JITTER}).")
+    parser.add_argument("--output_tokens", type=int, default=MOCK_OUTPUT_TOKENS,
+                        help=f"Tokens generated when a request sets no max_tokens (default: {MOCK_OUTPUT_TOKENS}).")
+
+    parser.add_argument("--capacity", type=int, default=MOCK_CAPACITY,
+                        help="Requests generated at once; more queue for a slot (default: unlimited).")
+
+    args = parser.parse_args()
+    print(f"Mock server listening on http://localhost:{args.port}/v1/chat/completions")
+    serve(args.port, args.ttft, args.itl, args.jitter, args.output_tokens, capacity=args.capacity)
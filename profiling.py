@@ -0,0 +1,205 @@
+"""
+Profiling hooks for the benchmark client itself (--profile).
+
+Three views tell client-side latency apart from server latency:
+  - per-phase timings of every request, taken with an aiohttp TraceConfig:
+    waiting for a pooled connection, connecting, writing the request, and
+    the time to response headers, first body byte and first content token;
+  - event-loop lag: how late a periodic callback actually runs, which grows
+    when the client cannot keep up with its own streams;
+  - a cProfile of the whole run, showing where the client spends CPU.
+"""
+import asyncio
+import base64
+import cProfile
+import io
+import marshal
+import pstats
+import time
+
+import aiohttp
+
+from benchmark_stats import REPORT_PERCENTILES, LogHistogram
+
+# Request phases, in the order a request goes through them, with report labels.
+PHASES = {
+    "queue": "Connection Queue",
+    "connect": "Connect",
+    "write": "Request Write",
+    "headers": "Time to Headers",
+    "first_byte": "Time to First Byte",
+    "first_token": "Time to First Token",
+}
+
+# How often the event-loop lag monitor wakes up, in seconds.
+LAG_INTERVAL = 0.01
+
+# Functions listed from the cProfile output, by cumulative and by own time.
+PROFILE_TOP = 30
+
+
+def phase_trace_config():
+    """
+    Returns a TraceConfig that timestamps the request phases into the dict
+    passed to session.post(..., trace_request_ctx=marks).
+    """
+    trace_config = aiohttp.TraceConfig()
+
+    def mark(name, keep_first=True):
+        async def callback(session, context, params):
+            marks = context.trace_request_ctx
+            if marks is not None and (not keep_first or name not in marks):
+                marks[name] = time.monotonic()
+        return callback
+
+    trace_config.on_connection_queued_start.append(mark("queued_start"))
+    trace_config.on_connection_queued_end.append(mark("queued_end"))
+    trace_config.on_connection_create_start.append(mark("connect_start"))
+    trace_config.on_connection_create_end.append(mark("connect_end"))
+    trace_config.on_request_headers_sent.append(mark("headers_sent"))
+    trace_config.on_request_chunk_sent.append(mark("request_sent", keep_first=False))
+    trace_config.on_request_end.append(mark("response_headers"))
+    return trace_config
+
+
+def phase_timings(marks, start_time, first_byte, first_token):
+    """
+    Turns the trace marks of one request into phase durations in seconds.
+    Queue, connect and write are durations; the others are measured from
+    `start_time`, when send_request began.
+    """
+    def between(begin, end):
+        return marks[end] - marks[begin] if begin in marks and end in marks else 0.0
+
+    phases = {
+        "queue": between("queued_start", "queued_end"),
+        "connect": between("connect_start", "connect_end"),
+        "first_byte": first_byte,
+        "first_token": first_token,
+    }
+    if "headers_sent" in marks:
+        # Writing starts once a connection is in hand and ends with the last body chunk.
+        ready = max(marks.get("queued_end", 0.0), marks.get("connect_end", 0.0), start_time)
+        phases["write"] = marks.get("request_sent", marks["headers_sent"]) - ready
+    if "response_headers" in marks:
+        phases["headers"] = marks["response_headers"] - start_time
+    return phases
+
+
+class EventLoopLagMonitor:
+    """Records how late a callback scheduled every `interval` seconds runs."""
+
+    def __init__(self, interval=LAG_INTERVAL):
+        self.interval = interval
+        self.lag = LogHistogram()
+        self.task = None
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag.record(max(time.monotonic() - expected, 0.0))
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+
+class PhaseStats:
+    """Result sink collecting a histogram per request phase."""
+
+    def __init__(self):
+        self.histograms = {name: LogHistogram() for name in PHASES}
+
+    def add(self, result):
+        for name, value in (result.get('phases') or {}).items():
+            if value is not None:
+                self.histograms[name].record(value)
+
+
+class ProfileData:
+    """cProfile data from another process, in the form pstats.Stats loads."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class RunProfiler:
+    """
+    cProfile, event-loop lag and request phases for one run. In runs split
+    over workers or agents, each load generator profiles itself and its
+    export() is merged into the parent's profiler.
+    """
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.loop_lag = EventLoopLagMonitor()
+        self.phases = PhaseStats()
+        self.shares = []
+
+    def start(self):
+        self.loop_lag.start()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.loop_lag.stop()
+
+    def export(self):
+        """Returns this process's cProfile data and event-loop lag as a JSON-safe dict, for merge()."""
+        self.profiler.create_stats()
+        lag = self.loop_lag.lag
+        return {
+            "stats": base64.b64encode(marshal.dumps(self.profiler.stats)).decode(),
+            "lag": [[index, count] for index, count in enumerate(lag.counts) if count],
+            "lag_total": lag.total,
+            "lag_range": [lag.min, lag.max] if lag.count else None,
+        }
+
+    def merge(self, exported):
+        """Adds the cProfile data and event-loop lag of another process's export()."""
+        self.shares.append(marshal.loads(base64.b64decode(exported['stats'])))
+        lag = self.loop_lag.lag
+        for index, count in exported['lag']:
+            lag.counts[index] += count
+            lag.count += count
+        lag.total += exported['lag_total']
+        if exported['lag_range']:
+            lag.min = min(lag.min, exported['lag_range'][0])
+            lag.max = max(lag.max, exported['lag_range'][1])
+
+    def _stats(self, stream=None):
+        stats = pstats.Stats(self.profiler, stream=stream)
+        # pstats empties what it loads, so each share is wrapped afresh.
+        stats.add(*(ProfileData(share) for share in self.shares if share))
+        return stats
+
+    def format_report(self, percentiles=REPORT_PERCENTILES):
+        """Returns the phase and loop-lag tables followed by the top cProfile entries."""
+        header = f"{'Phase':<22} {'mean':>10}" + "".join(f" {'p' + format(p, 'g'):>10}" for p in percentiles) \
+            + f" {'max':>10}"
+        rows = [(label, self.phases.histograms[name]) for name, label in PHASES.items()]
+        rows.append(("Event-Loop Lag", self.loop_lag.lag))
+        lines = ["--- Request Phases and Event-Loop Lag ---", header]
+        for label, histogram in rows:
+            if histogram.count:
+                values = [histogram.mean] + [histogram.percentile(p) for p in percentiles] + [histogram.max]
+                lines.append(f"{label:<22}" + "".join(f" {value:>9.4f}s" for value in values))
+
+        for sort_key in ("cumulative", "tottime"):
+            stream = io.StringIO()
+            self._stats(stream).sort_stats(sort_key).print_stats(PROFILE_TOP)
+            lines += ["", f"--- cProfile, top {PROFILE_TOP} by {sort_key} time ---", stream.getvalue().strip()]
+        return "\n".join(lines)
+
+    def save(self, text_path, stats_path):
+        """Writes the report to `text_path` and raw cProfile data (for snakeviz etc.) to `stats_path`."""
+        with open(text_path, "w") as f:
+            f.write(self.format_report() + "\n")
+        self._stats().dump_stats(stats_path)
@@ -0,0 +1,283 @@
+"""
+Content-addressed store of response transcripts, shared across runs.
+
+Every request is identified by a hash of its payload (model, prompt and
+generation parameters). Request and response texts are kept once each as
+blobs named by the hash of their content, so a transcript that recurs in
+run after run takes no extra space. A small SQLite index maps each request
+to its latest response with its token count, latency and the server build
+it came from. When the store outgrows its size bound, the least recently
+used blobs are evicted together with the entries that refer to them.
+
+When a request's response differs from the one stored under another server
+build, the entry is flagged as changed and keeps a reference to the previous
+response, for spot checks without re-running anything. This only points at
+the build when decoding is deterministic (temperature 0 or a fixed seed);
+with sampling, a response can differ on every run of the same build.
+
+
+    python3 response_store.py list
+    python3 response_store.py changes
+    python3 response_store.py show 3fa2c1d9
+"""
+import argparse # For command-line arguments
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+# --- Configuration (Default values) ---
+STORE_FOLDER = os.path.join("benchmark_output", "response_store")
+
+# Size bound of the stored blobs, in bytes.
+STORE_MAX_BYTES = 1024 ** 3
+
+# Index changes are committed every this many stored responses (and on close).
+COMMIT_EVERY = 200
+
+# Changed requests listed by name in a run's report.
+REPORT_CHANGES = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, size INTEGER, last_used REAL);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY, model TEXT, request TEXT, response TEXT, build TEXT,
+    completion_tokens INTEGER, total_time REAL, time_to_first_token REAL,
+    previous_response TEXT, previous_build TEXT, changed_at TEXT, updated_at TEXT
+);
+"""
+
+
+def request_key(request):
+    """Returns the hash identifying a request payload (model, prompt and parameters)."""
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+
+class ResponseStore:
+    """The blob folder and SQLite index under `folder`, bounded to `max_bytes` of blobs."""
+
+    def __init__(self, folder=STORE_FOLDER, max_bytes=STORE_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(folder, "objects"), exist_ok=True)
+        # Responses are stored from ResponseStoreSink's writer thread.
+        self.db = sqlite3.connect(os.path.join(folder, "index.sqlite"), check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.pending = 0
+
+    def _blob_path(self, digest):
+        return os.path.join(self.folder, "objects", digest[:2], digest[2:])
+
+    def _put_blob(self, text):
+        data = text.encode()
+        digest = hashlib.sha256(data).hexdigest()
+        row = self.db.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        if row is None:
+            path = self._blob_path(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+            self.db.execute("INSERT INTO blobs VALUES (?, ?, ?)", (digest, len(data), time.time()))
+        else:
+            self.db.execute("UPDATE blobs SET last_used = ? WHERE hash = ?", (time.time(), digest))
+        return digest
+
+    def read_blob(self, digest):
+        """Returns a blob's text, or None if it has been evicted."""
+        try:
+            with open(self._blob_path(digest), encoding="utf-8") as f:
+                return f.read()
+        except (OSError, TypeError):
+            return None
+
+    def put(self, request, response, build=None, metrics=None):
+        """
+        Stores `response` as the latest answer to `request` from server build
+        `build`. Returns (key, status) where status is "new", "unchanged",
+        "changed" (differs from a response of another build) or "varied"
+        (differs within the same build, e.g. from sampling).
+        """
+        key = request_key(request)
+        metrics = metrics or {}
+        response_hash = self._put_blob(response)
+        existing = self.db.execute("SELECT response, build, previous_response, previous_build, changed_at "
+                                   "FROM entries WHERE key = ?", (key,)).fetchone()
+        now = time.strftime("%Y-%m-%dT%H:%M:%S")
+        previous = existing[2:] if existing else (None, None, None)
+        if existing is None:
+            status = "new"
+        elif existing[0] == response_hash:
+            status = "unchanged"
+        elif existing[1] != build:
+            status = "changed"
+            previous = (existing[0], existing[1], now)
+        else:
+            status = "varied"
+        self.db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, request.get('model'), self._put_blob(json.dumps(request, sort_keys=True)), response_hash, build,
+             metrics.get('completion_tokens'), metrics.get('total_time'), metrics.get('time_to_first_token'),
+             *previous, now)
+        )
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.commit()
+        return key, status
+
+    def commit(self):
+        """Commits the index and evicts least recently used blobs beyond the size bound."""
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total > self.max_bytes:
+            evicted = []
+            for digest, size in self.db.execute("SELECT hash, size FROM blobs ORDER BY last_used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                evicted.append(digest)
+                total -= size
+            for digest in evicted:
+                self.db.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+                self.db.execute("DELETE FROM entries WHERE request = ? OR response = ?", (digest, digest))
+                try:
+                    os.remove(self._blob_path(digest))
+                except OSError:
+                    pass
+        self.db.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+    def find(self, prefix):
+        """Returns the entry whose key starts with `prefix` as a dict, or None."""
+        cursor = self.db.execute("SELECT * FROM entries WHERE key LIKE ?", (prefix + "%",))
+        rows = cursor.fetchmany(2)
+        if len(rows) != 1:
+            return None
+        entry = dict(zip([column[0] for column in cursor.description], rows[0]))
+        self.db.execute("UPDATE blobs SET last_used = ? WHERE hash IN (?, ?)",
+                        (time.time(), entry['request'], entry['response']))
+        self.db.commit()
+        return entry
+
+    def entries(self, changed_only=False, limit=None):
+        """Returns index rows (key, model, build, tokens, previous build, updated), newest first."""
+        query = "SELECT key, model, build, completion_tokens, previous_build, changed_at, updated_at FROM entries"
+        if changed_only:
+            query += " WHERE changed_at IS NOT NULL"
+        query += " ORDER BY updated_at DESC"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        return self.db.execute(query).fetchall()
+
+
+class ResponseStoreSink:
+    """
+    Result sink moving each captured request and response into a
+    ResponseStore. The result keeps only the response's key, so per-request
+    logs do not repeat the transcripts. Blob writes and index updates run on
+    a writer thread, off the event loop that times the requests; close()
+    waits for them and closes the store.
+    """
+
+    def __init__(self, store, build=None):
+        self.store = store
+        self.build = build
+        self.counts = Counter()
+        self.changed = []
+        self.pending = queue.Queue()
+        self.writer = threading.Thread(target=self._write, daemon=True)
+        self.writer.start()
+
+    def add(self, result):
+        request = result.pop('request', None)
+        response = result.pop('response', None)
+        if result['status'] != 'success' or request is None or response is None:
+            return
+        result['response_key'] = request_key(request)
+        metrics = {name: result.get(name) for name in ('completion_tokens', 'total_time', 'time_to_first_token')}
+        self.pending.put((request, response, metrics))
+
+    def _write(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            key, status = self.store.put(*item[:2], self.build, item[2])
+            self.counts[status] += 1
+            if status == "changed":
+                self.changed.append(key)
+
+    def close(self):
+        """Stores the responses still queued and closes the store."""
+        self.pending.put(None)
+        self.writer.join()
+        self.store.close()
+
+    def format_report(self):
+        """Returns the stored / deduplicated / changed counts and the first changed requests."""
+        stored = sum(self.counts.values())
+        lines = [
+            f"Response Store: {stored} responses in '{self.store.folder}' ({self.counts['new']} new, "
+            f"{self.counts['unchanged']} unchanged, {self.counts['varied']} varied within the same build)",
+        ]
+        if self.changed:
+            lines.append(f"Changed Since an Earlier Build: {len(self.changed)} responses "
+                         f"(view with: python3 response_store.py show KEY)")
+            lines += [f"  {key[:16]}" for key in self.changed[:REPORT_CHANGES]]
+            if len(self.changed) > REPORT_CHANGES:
+                lines.append(f"  ... and {len(self.changed) - REPORT_CHANGES} more (python3 response_store.py changes)")
+            if self.counts['varied']:
+                lines.append("Note: responses also varied within this build, so the server samples and the "
+                             "changes may be sampling noise rather than the build.")
+        if self.build is None:
+            lines.append("Note: no server build given, so differing responses count as varied; "
+                         "pass --server_build to flag changes between builds.")
+        return "\n".join(lines)
+
+
+def show_entry(store, prefix):
+    entry = store.find(prefix)
+    if entry is None:
+        raise SystemExit(f"No single stored request matches '{prefix}'.")
+    request = json.loads(store.read_blob(entry['request']) or "{}")
+    print(f"Key: {entry['key']}")
+    print(f"Model: {entry['model']}  Build: {entry['build']}  Updated: {entry['updated_at']}")
+    print(f"Completion Tokens: {entry['completion_tokens']}  Total Time: {entry['total_time']}")
+    prompt = request.get('messages') or request.get('prompt')
+    print(f"Prompt: {json.dumps(prompt, indent=2) if not isinstance(prompt, str) else prompt}")
+    print(f"Response: {store.read_blob(entry['response'])}")
+    if entry['changed_at']:
+        previous = store.read_blob(entry['previous_response'])
+        print(f"\nChanged at {entry['changed_at']} from build {entry['previous_build']}; previous response:")
+        print(previous if previous is not None else "(evicted)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the stored response transcripts.")
+    parser.add_argument("--store", type=str, default=STORE_FOLDER,
+                        help=f"Response store folder (default: {STORE_FOLDER}).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    list_parser = subparsers.add_parser("list", help="List the most recently stored requests.")
+    list_parser.add_argument("-n", type=int, default=50, help="Number of entries to list (default: 50).")
+    subparsers.add_parser("changes", help="List requests whose response changed between server builds.")
+    show_parser = subparsers.add_parser("show", help="Print one request, its response and any previous response.")
+    show_parser.add_argument("key", help="A key or unique key prefix.")
+
+    args = parser.parse_args()
+    store = ResponseStore(args.store)
+    if args.command == "show":
+        show_entry(store, args.key)
+    else:
+        rows = store.entries(changed_only=args.command == "changes", limit=getattr(args, "n", None))
+        print(f"{'Key':<16} {'Model':<28} {'Build':<14} {'Tokens':>6}  Updated")
+        for key, model, build, tokens, previous_build, changed_at, updated_at in rows:
+            note = f"  changed from {previous_build} at {changed_at}" if changed_at else ""
+            print(f"{key[:16]:<16} {str(model):<28} {str(build):<14} {tokens if tokens is not None else '-':>6}  "
+                  f"{updated_at}{note}")
+    store.close()
@@ -0,0 +1,93 @@
+"""
+Append-only per-request result log.
+
+Each result is written as one JSON line the moment it completes, after a
+header line describing the run, and the file is flushed periodically. A run
+that crashes or is interrupted still leaves every finished request on disk.
+"""
+import json
+import time
+from datetime import datetime
+
+# Flush to disk at least this often (seconds) and every FLUSH_EVERY records.
+FLUSH_INTERVAL = 1.0
+FLUSH_EVERY = 1000
+
+
+def to_record(result):
+    """Converts a result dict into JSON-serializable form."""
+    record = {"type": "result"}
+    for key, value in result.items():
+        if key == "chunk_times" and value is not None:
+            value = [round(t, 6) for t in value]
+        record[key] = value
+    return record
+
+
+class JsonlResultSink:
+    """Writes results to `path` as JSON lines; use it like BenchmarkStats."""
+
+    def __init__(self, path, run_info=None):
+        self.path = path
+        self.file = open(path, "w")
+        self.pending = 0
+        self.last_flush = time.monotonic()
+        header = {"type": "run", "started": datetime.now().isoformat(), "start_time": time.time()}
+        header.update(run_info or {})
+        self.file.write(json.dumps(header) + "\n")
+        self.file.flush()
+
+    def add(self, result):
+        self.file.write(json.dumps(to_record(result)) + "\n")
+        self.pending += 1
+        if self.pending >= FLUSH_EVERY or time.monotonic() - self.last_flush > FLUSH_INTERVAL:
+            self.flush()
+
+    def mark(self, name, **fields):
+        """Writes a `name` record with `fields`, e.g. when the measured part of the run began."""
+        self.file.write(json.dumps({"type": name, **fields}) + "\n")
+
+    def flush(self):
+        self.file.flush()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.file.close()
+
+
+class ResultFanout:
+    """Passes each result on to several sinks, e.g. statistics and a log file."""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def add(self, result):
+        for sink in self.sinks:
+            sink.add(result)
+
+
+def read_records(path):
+    """
+    Returns (header, results) for a result log: the run header dict and a
+    generator of result dicts. Records written with JsonlResultSink.mark are
+    added to the header under their name as they are read, so the header is
+    complete once the results are exhausted. A truncated last line, left by a
+    crash, is skipped.
+    """
+    f = open(path)
+    header = json.loads(f.readline())
+
+    def results():
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("type") == "result":
+                    yield record
+                elif record.get("type") != "run":
+                    header[record.pop("type")] = record
+
+    return header, results()
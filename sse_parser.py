@@ -0,0 +1,111 @@
+"""
+Incremental parser for OpenAI-compatible chat completion streams.
+
+Both benchmark scripts feed raw network reads straight into a
+ChatStreamParser. It splits them into server-sent events itself, so that
+partial reads and multi-line `data:` events are handled in one place. When
+responses are not being captured, content chunks are detected with a byte
+scan instead of a full `json.loads` per chunk.
+"""
+import json
+from array import array
+
+CONTENT_KEY = b'"content"'
+USAGE_KEY = b'"usage"'
+DONE_PAYLOAD = b"[DONE]"
+
+
+def has_content(payload):
+    """
+    Returns True if the first `"content"` key in a chunk holds a non-empty
+    string. Quotes inside JSON strings are escaped, so the key cannot be
+    matched inside message text.
+    """
+    index = payload.find(CONTENT_KEY)
+    if index < 0:
+        return False
+    index += len(CONTENT_KEY)
+    length = len(payload)
+    while index < length and payload[index] in b" \t:":
+        index += 1
+    return payload[index:index + 1] == b'"' and payload[index + 1:index + 2] != b'"'
+
+
+class ChatStreamParser:
+    """
+    Accumulates one streamed response: the offset of every content chunk,
+    the usage block if the server sends one, and (only with `capture`) the
+    response text.
+    """
+
+    def __init__(self, capture=False):
+        self.capture = capture
+        self.buffer = bytearray()
+        self.data_lines = []
+        self.chunk_times = array('d')
+        self.chunk_count = 0
+        self.usage = None
+        self.content_parts = [] if capture else None
+        self.done = False
+
+    def feed(self, data, timestamp):
+        """
+        Parses a raw read of the response body received at `timestamp`.
+        Returns True once the `[DONE]` sentinel has been seen.
+        """
+        if b"\n" not in data:
+            self.buffer += data
+            return self.done
+        lines = (bytes(self.buffer) + data if self.buffer else data).split(b"\n")
+        # The last piece is an incomplete line (empty when the read ended on a newline).
+        self.buffer = bytearray(lines.pop())
+        for line in lines:
+            if self.done:
+                break
+            if line.endswith(b"\r"):
+                line = line[:-1]
+            if not line:
+                self._dispatch(timestamp)
+            elif line.startswith(b"data:"):
+                value = line[5:]
+                self.data_lines.append(value[1:] if value.startswith(b" ") else value)
+        return self.done
+
+    def close(self, timestamp):
+        """Dispatches a final event the server did not terminate with a blank line."""
+        if self.buffer.strip():
+            self.feed(b"\n", timestamp)
+        self._dispatch(timestamp)
+
+    def text(self):
+        """Returns the captured response text ('' when capture is off)."""
+        return "".join(self.content_parts) if self.capture else ""
+
+    def _dispatch(self, timestamp):
+        if not self.data_lines:
+            return
+        payload = b"\n".join(self.data_lines)
+        self.data_lines = []
+
+        if payload.strip() == DONE_PAYLOAD:
+            self.done = True
+            return
+
+        if self.capture or USAGE_KEY in payload:
+            try:
+                data = json.loads(payload)
+            except json.JSONDecodeError:
+                return
+            if data.get('usage'):
+                self.usage = data['usage']
+            choices = data.get('choices')
+            content = choices[0].get('delta', {}).get('content') if choices else None
+            if not content:
+                return
+            if self.capture:
+                self.content_parts.append(content)
+        elif not has_content(payload):
+            return
+
+        self.chunk_times.append(timestamp)
+        self.chunk_count += 1
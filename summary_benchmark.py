@@ -1,19 +1,46 @@
 import time
-import json
 import os
 import asyncio
 import aiohttp
 import argparse # For command-line arguments
+import random
+from array import array
 from collections import defaultdict
 from datetime import datetime
-from itertools import cycle
-from tqdm.asyncio import tqdm_asyncio
+from itertools import cycle, islice
+from tqdm import tqdm
+from benchmark_stats import BenchmarkStats, decode_metrics, meets_slo, steady_state_window
+from endpoint_pool import BALANCING_POLICIES, EndpointPool, parse_endpoints
+from result_sink import JsonlResultSink, ResultFanout, read_records
+import columnar_results
+from telemetry import TimeSeries, live_telemetry
+from profiling import RunProfiler, phase_timings, phase_trace_config
+from adaptive_concurrency import AIMDLimiter
+from distributed import run_agent, run_agents, run_workers
+from response_store import STORE_MAX_BYTES, ResponseStore, ResponseStoreSink
+from sse_parser import ChatStreamParser
+from token_counter import estimate_tokens, resolve_token_counts
+from workload import (
+    COLD_PREFIX_CATEGORY, CONVERSATION_CATEGORY, SHARED_PREFIX_CATEGORY, iter_prefix_plan, iter_synthetic_plan,
+    iter_trace_schedule, parse_distribution, request_messages, request_text,
+)
 
 # --- Configuration (Default values) ---
 # These can be overridden by command-line arguments.
 # Set the API endpoint for your server.
 API_URL = "http://localhost:8001/v1/chat/completions"
 
+# Model name sent with every request.
+MODEL_NAME = "openai/gpt-oss-120b"
+
+# Optional list of replicas to spread the load over, as (url, weight) pairs.
+# None sends everything to API_URL.
+ENDPOINTS = None
+
+# How requests are spread over ENDPOINTS: "round_robin", "least_outstanding"
+# or "weighted".
+LOAD_BALANCING = "round_robin"
+
 # Define the folder to save the results.
 OUTPUT_FOLDER = "benchmark_output"
 
@@ -29,6 +56,134 @@ NUM_REQUESTS_PER_CATEGORY = 200
 # Maximum number of tokens to generate for each response.
 MAX_TOKENS = 150
 
+# Optional path to a local tokenizer.json used to count tokens when the
+# server does not stream back a `usage` block.
+TOKENIZER_FILE = None
+
+# Target arrival rate (requests per second) for open-loop mode.
+# None keeps the closed-loop mode bounded by MAX_CONCURRENT_REQUESTS.
+REQUEST_RATE = None
+
+# Inter-arrival pattern used in open-loop mode: "poisson", "constant" or "burst".
+ARRIVAL_PATTERN = "poisson"
+
+# Number of requests fired at the same instant by the "burst" arrival pattern.
+BURST_SIZE = 10
+
+# Optional JSONL trace of {timestamp, messages, max_tokens, category} records
+# to replay at its original pace instead of the built-in prompts.
+TRACE_FILE = None
+
+# Replay speed-up for traces: 2.0 sends the trace twice as fast.
+TIME_SCALE = 1.0
+
+# Request source: "prompts" cycles CATEGORIZED_PROMPTS, "synthetic" generates
+# prompts whose input length and max_tokens follow the distributions below
+# (see workload.parse_distribution for the format), and "prefix" puts those
+# prompts behind shared system prompts to measure prefix caching.
+WORKLOAD = "prompts"
+INPUT_LENGTHS = "lognormal:512:0.8"
+OUTPUT_LENGTHS = "uniform:64:256"
+
+# Prefix-cache workload: length of the shared system prompt, the share of
+# conversations that reuse an earlier one's prompt, and turns per conversation.
+PREFIX_TOKENS = 2048
+PREFIX_HIT_RATIO = 0.8
+CONVERSATION_TURNS = 1
+
+# Seed for the arrival schedule and synthetic workload. None picks a random seed per run.
+SEED = None
+
+# Number of load-generating processes, each with its own event loop and sessions.
+NUM_WORKERS = 1
+
+# Warm-up sent before the measured run, at the run's concurrency, and left
+# out of every statistic: a number of requests and/or a duration in seconds
+# (whichever ends first when both are set). Warms up connections and server
+# caches.
+WARMUP_REQUESTS = 0
+WARMUP_SECONDS = 0
+
+# Warm-up prompts of a seeded workload are drawn with the run's seed XOR this
+# value, so they differ from the measured prompts.
+WARMUP_SEED_SALT = 0x5eed
+
+# Requests finishing in the last COOLDOWN_SECONDS of the run, while the load
+# drains, are left out of the report.
+COOLDOWN_SECONDS = 0
+
+# Report only the window where throughput has stabilized, found from the
+# per-request records. Needs WRITE_RECORDS.
+STEADY_STATE = False
+
+# Distributed mode: number of agents (other hosts or processes started with
+# --agent HOST:PORT) the coordinator waits for before starting. 0 generates
+# all the load from this machine.
+NUM_AGENTS = 0
+
+# Port the coordinator listens on for agents.
+COORDINATOR_PORT = 8950
+
+# Keep every response transcript in the content-addressed response store
+# (see response_store.py), flagging responses that change between server
+# builds. SERVER_BUILD labels the build under test, e.g. a version or commit.
+STORE_RESPONSES = False
+SERVER_BUILD = None
+
+# Write every per-request result to a JSONL log next to the summary file.
+WRITE_RECORDS = True
+
+# Also convert that log into a columnar .npz for analyze_results.py
+# (skipped when NumPy is not installed).
+WRITE_COLUMNAR = True
+
+# Write a CSV time series of throughput, in-flight requests and TTFT
+# percentiles, one row per TELEMETRY_INTERVAL seconds, while the run goes.
+WRITE_TIMESERIES = True
+TELEMETRY_INTERVAL = 1.0
+
+# Serve live rolling-window metrics in OpenMetrics format at
+# http://localhost:PORT/metrics. None disables the endpoint.
+METRICS_PORT = None
+
+# Concurrency ladder used by --sweep (and the upper bound for --search).
+SWEEP_LEVELS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+# Service level objectives, in seconds; None disables a limit. A request
+# counts towards goodput when its TTFT, end-to-end latency and p99 gap
+# between chunks are within every limit that is set. A sweep step meets the
+# SLO when its p99 values are.
+SLO_TTFT = None
+SLO_LATENCY = None
+SLO_ITL = None
+
+# How requests are sent: "stream" (SSE, per-token timings), "non_stream"
+# (one JSON response; latency and usage only) or "batch" (non-streaming
+# requests to the /v1/completions endpoint carrying BATCH_SIZE prompts each,
+# as in offline batch scoring). N_CHOICES sets the OpenAI `n` parameter in
+# the non-streaming modes.
+REQUEST_MODE = "stream"
+BATCH_SIZE = 8
+N_CHOICES = 1
+
+# Hourly cost of the deployment under test (e.g. GPU rental), used to report
+# the cost per million output tokens. None leaves it out.
+COST_PER_HOUR = None
+
+# Adaptive mode: a p95 time-to-first-token target in seconds. The number of
+# requests in flight then adapts at run time, between 1 and
+# MAX_CONCURRENT_REQUESTS, to hold it (see adaptive_concurrency.py). None
+# keeps the concurrency fixed.
+ADAPTIVE_TTFT = None
+
+# Per-request deadline in seconds. Requests still running are abandoned and
+# counted as TimeoutError. None keeps aiohttp's 5 minute default.
+REQUEST_TIMEOUT = None
+
+# Without an SLO, the knee is the lowest concurrency that reaches this
+# fraction of the peak output throughput seen in the sweep.
+KNEE_FRACTION = 0.9
+
 # --- Prompts ---
 CATEGORIZED_PROMPTS = {
     "information_retrieval": [
@@ -242,104 +397,663 @@ CATEGORIZED_PROMPTS = {
 }
 
 
-async def send_request(session, semaphore, prompt, category, request_num, max_tokens):
+async def send_request(endpoints, prompt, category, request_num, request_config, scheduled_time=None):
     """
     Sends a single asynchronous request to the API and captures metrics.
-    A semaphore is used to limit the number of concurrent requests.
+    `prompt` is a prompt string or a workload request dict with its own
+    messages and max_tokens, or in batch mode a list of those.
+    The request goes to the endpoint `endpoints` (an EndpointPool) picks.
+    If `scheduled_time` is given, the result records how far the actual
+    send lagged behind it.
     """
-    async with semaphore:
+    mode = request_config['mode']
+    prompts = prompt if isinstance(prompt, list) else [prompt]
+    # A batch shares one max_tokens: the largest any of its prompts asks for.
+    max_tokens = max(p.get('max_tokens', request_config['max_tokens']) if isinstance(p, dict)
+                     else request_config['max_tokens'] for p in prompts)
+    if mode == "batch":
+        request_payload = {
+            "model": request_config['model'],
+            "prompt": [request_text(p) for p in prompts],
+            "max_tokens": max_tokens,
+            "n": request_config['n'],
+        }
+    elif mode == "non_stream":
         request_payload = {
-            "model": "openai/gpt-oss-120b",
-            "messages": [{"role": "user", "content": prompt}],
+            "model": request_config['model'],
+            "messages": request_messages(prompt),
             "max_tokens": max_tokens,
-            "stream": True
+            "n": request_config['n'],
+        }
+    else:
+        request_payload = {
+            "model": request_config['model'],
+            "messages": request_messages(prompt),
+            "max_tokens": max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True},
         }
 
-        start_total_time = time.monotonic()
+    start_total_time = time.monotonic()
+    start_wall_time = time.time()
+    schedule_lag = start_total_time - scheduled_time if scheduled_time is not None else None
+    endpoint = endpoints.acquire()
+    # With --profile, aiohttp trace hooks timestamp each request phase into this dict.
+    marks = {} if request_config['profile'] else None
+    first_byte = None
 
-        try:
-            async with session.post(API_URL, json=request_payload) as response:
-                response.raise_for_status()
-
-                first_token_time = None
-                tokens_count = 0
-                full_response_content = ""
-
-                async for line in response.content:
-                    line = line.decode('utf-8').strip()
-                    if line.startswith("data: "):
-                        json_data = line[len("data: "):]
-                        if json_data.strip() == "[DONE]":
-                            break
-                        try:
-                            data = json.loads(json_data)
-                            content = data['choices'][0].get('delta', {}).get('content', '')
-                            if content:
-                                if first_token_time is None:
-                                    first_token_time = time.monotonic() - start_total_time
-                                full_response_content += content
-                                tokens_count += 1
-                        except (json.JSONDecodeError, KeyError):
-                            continue
-
-                end_total_time = time.monotonic()
-                total_time = end_total_time - start_total_time
-                tps = tokens_count / total_time if total_time > 0 and tokens_count > 0 else 0
-
-                return {
-                    "status": "success",
-                    "time_to_first_token": first_token_time if first_token_time is not None else total_time,
-                    "tokens_per_second": tps,
-                }
-        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            return {
-                "status": "error",
-                "error": str(e),
+    try:
+        url = completions_url(endpoint.url) if mode == "batch" else endpoint.url
+        async with endpoint.session.post(url, json=request_payload, trace_request_ctx=marks) as response:
+            response.raise_for_status()
+
+            if mode == "stream":
+                # The response text is only decoded when it is kept or
+                # needed for local token counting.
+                stream = ChatStreamParser(
+                    capture=request_config['capture_responses'] or request_config['tokenizer_path'] is not None
+                )
+                async for data in response.content.iter_any():
+                    if first_byte is None:
+                        first_byte = time.monotonic() - start_total_time
+                    if stream.feed(data, time.monotonic() - start_total_time):
+                        break
+                else:
+                    stream.close(time.monotonic() - start_total_time)
+                chunk_times, usage = stream.chunk_times, stream.usage
+                response_text, chunk_count = stream.text(), stream.chunk_count
+            else:
+                # The whole completion arrives at once, so its first token
+                # is only seen when the request ends.
+                body = await response.json()
+                first_byte = time.monotonic() - start_total_time
+                if not isinstance(body, dict):
+                    raise ValueError("The response body is not a JSON object.")
+                chunk_times, usage = array('d'), body.get('usage')
+                response_text = "\n".join((choice.get('message') or {}).get('content') or choice.get('text') or ""
+                                          for choice in body.get('choices') or [])
+                chunk_count = estimate_tokens(response_text)
+
+            end_total_time = time.monotonic()
+            total_time = end_total_time - start_total_time
+            prompt_tokens, tokens_count, token_source = resolve_token_counts(
+                usage, lambda: "\n".join(request_text(p) for p in prompts), response_text, chunk_count,
+                request_config['tokenizer_path']
+            )
+            if mode != "stream" and token_source == "chunks":
+                token_source = "estimate"
+            prompt_details = (usage or {}).get('prompt_tokens_details') or {}
+            tps = tokens_count / total_time if total_time > 0 and tokens_count > 0 else 0
+            ttft = chunk_times[0] if chunk_times else total_time
+
+            result = {
+                "status": "success",
+                "category": category,
+                "backend": endpoint.name,
+                "request_num": request_num,
+                "start_time": start_wall_time,
+                "time_to_first_token": ttft,
+                "tokens_per_second": tps,
+                "total_time": total_time,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": tokens_count,
+                "cached_tokens": prompt_details.get('cached_tokens'),
+                "token_source": token_source,
+                "prefill_tokens_per_second": prompt_tokens / ttft if prompt_tokens and chunk_times else None,
+                "decode_tokens_per_second": (tokens_count - 1) / (total_time - ttft)
+                                            if tokens_count > 1 and total_time > ttft else None,
+                "chunk_times": chunk_times,
+                "schedule_lag": schedule_lag,
+                **decode_metrics(chunk_times, tokens_count),
             }
+            if request_config['capture_responses']:
+                result["response"] = response_text
+                result["request"] = request_payload
+            if marks is not None:
+                result["phases"] = phase_timings(marks, start_total_time, first_byte, ttft)
+            return result
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        # ValueError: a non-streamed body that is not valid JSON.
+        return {
+            "status": "error",
+            "category": category,
+            "backend": endpoint.name,
+            "request_num": request_num,
+            "start_time": start_wall_time,
+            "error": str(e),
+            "error_type": classify_error(e),
+            "schedule_lag": schedule_lag,
+        }
+    finally:
+        endpoints.release(endpoint)
 
 
-def write_results_to_file(summary_text, run_config):
-    """Writes the final summary to a file."""
+def iter_request_plan(num_requests):
+    """Yields (category, request_num, prompt) for every request in the run."""
+    for category, prompts in CATEGORIZED_PROMPTS.items():
+        prompt_iterator = cycle(prompts)
+        for i in range(num_requests):
+            yield category, i + 1, next(prompt_iterator)
+
+
+def build_request_plan(load_config):
+    """
+    Returns (request_plan, total_requests) for the configured workload, with
+    its prompts grouped into batches when load_config['batch_size'] > 1.
+    """
+    plan, total_requests = build_prompt_plan(load_config)
+    if load_config['batch_size'] > 1:
+        return iter_batches(plan, load_config['batch_size']), -(-total_requests // load_config['batch_size'])
+    return plan, total_requests
+
+
+def build_prompt_plan(load_config):
+    """Returns (request_plan, total_requests) with one prompt per request."""
+    if load_config['workload'] == "synthetic":
+        plan = iter_synthetic_plan(load_config['num_requests'], parse_distribution(load_config['input_lengths']),
+                                   parse_distribution(load_config['output_lengths']), load_config['seed'])
+        return plan, load_config['num_requests']
+    if load_config['workload'] == "prefix":
+        plan = iter_prefix_plan(load_config['num_requests'], load_config['prefix_tokens'],
+                                parse_distribution(load_config['input_lengths']),
+                                parse_distribution(load_config['output_lengths']), load_config['hit_ratio'],
+                                load_config['turns'], load_config['seed'], spacing=load_config['concurrency'])
+        return plan, load_config['num_requests']
+    return iter_request_plan(load_config['num_requests']), load_config['num_requests'] * len(CATEGORIZED_PROMPTS)
+
+
+def arrival_offsets(rate, pattern, burst_size=BURST_SIZE, seed=None):
+    """
+    Yields the scheduled send time of each request, in seconds from the start
+    of the run, for an open-loop arrival process averaging `rate` requests/s.
+    The same seed always yields the same schedule.
+    """
+    if pattern == "poisson":
+        rng = random.Random(seed)
+        offset = 0.0
+        while True:
+            yield offset
+            offset += rng.expovariate(rate)
+    elif pattern == "constant":
+        interval = 1.0 / rate
+        n = 0
+        while True:
+            yield n * interval
+            n += 1
+    elif pattern == "burst":
+        interval = burst_size / rate
+        n = 0
+        while True:
+            for _ in range(burst_size):
+                yield n * interval
+            n += 1
+    else:
+        raise ValueError(f"Unknown arrival pattern: {pattern}")
+
+
+def build_arrival_schedule(request_plan, rate, pattern, burst_size, seed):
+    """Pairs every planned request with its scheduled offset in seconds."""
+    for offset, (category, request_num, prompt) in zip(arrival_offsets(rate, pattern, burst_size, seed), request_plan):
+        yield offset, category, request_num, prompt
+
+
+def completions_url(url):
+    """Returns the /v1/completions URL on the same server as a chat completions URL."""
+    return url.replace("/chat/completions", "/completions")
+
+
+def iter_batches(request_plan, batch_size):
+    """
+    Groups a request plan into (category, request_num, prompts) batches of
+    `batch_size`. A batch mixing categories is filed under "mixed".
+    """
+    while True:
+        batch = list(islice(request_plan, batch_size))
+        if not batch:
+            return
+        categories = {category for category, _, _ in batch}
+        yield (categories.pop() if len(categories) == 1 else "mixed"), batch[0][1], [p for _, _, p in batch]
+
+
+def classify_error(error):
+    """Names a failed request's error by HTTP status or exception class."""
+    # A body that is not JSON (wrong content type or malformed) comes with a 200 status.
+    if isinstance(error, (aiohttp.ContentTypeError, ValueError)):
+        return "InvalidResponse"
+    if isinstance(error, aiohttp.ClientResponseError):
+        return f"HTTP {error.status}"
+    return type(error).__name__
+
+
+async def run_open_loop(endpoints, schedule, total_requests, request_config, stats, show_progress=True):
+    """
+    Fires requests on an arrival schedule no matter how many are still in
+    flight, so the offered load stays fixed even when the server slows down.
+    Each result is folded into `stats` as it completes. If a request or its
+    result handling raises, sending stops and the first exception is
+    re-raised once the requests in flight have finished.
+    """
+    # Only in-flight requests are kept; finished tasks drop out of the set.
+    tasks = set()
+    failures = []
+    progress = tqdm(total=total_requests, desc="Running benchmark", disable=not show_progress)
+    start_time = time.monotonic()
+
+    def on_done(task):
+        tasks.discard(task)
+        try:
+            stats.add(task.result())
+            progress.update(1)
+        except Exception as e:
+            failures.append(e)
+
+    for offset, category, request_num, prompt in schedule:
+        if failures:
+            break
+        scheduled_time = start_time + offset
+        delay = scheduled_time - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(
+            send_request(endpoints, prompt, category, request_num, request_config, scheduled_time)
+        )
+        tasks.add(task)
+        task.add_done_callback(on_done)
+
+    while tasks:
+        await asyncio.wait(tasks)
+    progress.close()
+    if failures:
+        raise failures[0]
+
+
+async def run_closed_loop(endpoints, request_plan, concurrency, request_config, stats, total_requests=None,
+                          desc="Running benchmark", show_progress=True):
+    """
+    Runs the request plan with at most `concurrency` requests in flight,
+    folding each result into `stats` as it completes. `concurrency` consumers
+    pull requests from the plan lazily, so memory does not grow with the
+    number of requests.
+    """
+    request_plan = iter(request_plan)
+    progress = tqdm(total=total_requests, desc=desc, disable=not show_progress)
+
+    async def consumer():
+        for category, request_num, prompt in request_plan:
+            stats.add(await send_request(endpoints, prompt, category, request_num, request_config))
+            progress.update(1)
+
+    await asyncio.gather(*(consumer() for _ in range(concurrency)))
+    progress.close()
+
+
+async def run_adaptive_loop(endpoints, request_plan, limiter, request_config, stats, total_requests=None,
+                            show_progress=True):
+    """
+    Runs the request plan with as many requests in flight as `limiter` (an
+    AIMDLimiter) allows at each moment, folding each result into `stats`.
+    As in the open loop, the first exception stops sending and is re-raised
+    once the requests in flight have finished.
+    """
+    tasks = set()
+    failures = []
+    progress = tqdm(total=total_requests, desc="Running benchmark", disable=not show_progress)
+
+    def on_done(task):
+        tasks.discard(task)
+        try:
+            result = task.result()
+        except Exception as e:
+            failures.append(e)
+            limiter.discard()
+            return
+        limiter.release(result)
+        try:
+            stats.add(result)
+            progress.update(1)
+            progress.set_postfix(limit=limiter.limit, refresh=False)
+        except Exception as e:
+            failures.append(e)
+
+    for category, request_num, prompt in request_plan:
+        await limiter.acquire()
+        if failures:
+            limiter.discard()
+            break
+        task = asyncio.create_task(send_request(endpoints, prompt, category, request_num, request_config))
+        tasks.add(task)
+        task.add_done_callback(on_done)
+
+    while tasks:
+        await asyncio.wait(tasks)
+    progress.close()
+    if failures:
+        raise failures[0]
+
+
+def iter_warmup_plan(load_config, warmup_requests, warmup_seconds):
+    """
+    Yields warm-up requests drawn from the run's workload, repeating it if
+    needed, until `warmup_requests` have been taken or `warmup_seconds` have
+    passed (whichever comes first of those that are set). Generated
+    workloads are drawn with a seed derived from the run's, and a trace is
+    not replayed, so the warm-up does not pre-fill the server's prefix cache
+    with the measured requests.
+    """
+    seed = load_config['seed'] ^ WARMUP_SEED_SALT if load_config['seed'] is not None else None
+    # Trace records are all replayed in the measured run; warm up on the built-in prompts instead.
+    workload = "prompts" if load_config['trace'] is not None else load_config['workload']
+    plan, _ = build_request_plan(dict(load_config, seed=seed, workload=workload))
+    plan = cycle(plan)
+    if warmup_requests:
+        plan = islice(plan, warmup_requests)
+    deadline = time.monotonic() + warmup_seconds if warmup_seconds else None
+    for item in plan:
+        if deadline is not None and time.monotonic() >= deadline:
+            return
+        yield item
+
+
+async def run_warmup(endpoints, load_config, request_config, concurrency, worker_index=0, num_workers=1,
+                     show_progress=True):
+    """Sends this process's share of the warm-up on `endpoints`, discarding the results."""
+    warmup_requests = len(range(worker_index, load_config['warmup_requests'], num_workers))
+    if not warmup_requests and not load_config['warmup_seconds']:
+        return
+    stats = BenchmarkStats()
+    await run_closed_loop(endpoints, iter_warmup_plan(load_config, warmup_requests, load_config['warmup_seconds']),
+                          concurrency, request_config, stats, warmup_requests or None, desc="Warming up",
+                          show_progress=show_progress)
+    if show_progress:
+        print(f"Warm-up: {stats.overall.requests} requests ({stats.overall.errors} errors), not counted.\n")
+
+
+async def run_schedule(endpoints, load_config, request_config, stats, concurrency, worker_index=0, num_workers=1,
+                       show_progress=True, limiter=None):
+    """
+    Sends worker `worker_index`'s share of the request schedule on `endpoints`:
+    the trace, the open-loop arrival schedule or, in closed loop, the request
+    plan with `concurrency` requests in flight (or as many as `limiter` allows).
+    """
+    request_plan, total_requests = build_request_plan(load_config)
+    worker_requests = len(range(worker_index, total_requests, num_workers))
+    if load_config['trace'] is not None:
+        # The trace length is unknown until it has been read.
+        schedule = iter_trace_schedule(load_config['trace'], load_config['time_scale'])
+        await run_open_loop(endpoints, islice(schedule, worker_index, None, num_workers), None,
+                            request_config, stats, show_progress)
+    elif load_config['rate'] is not None:
+        schedule = build_arrival_schedule(request_plan, load_config['rate'], load_config['arrival'],
+                                          load_config['burst_size'], load_config['seed'])
+        await run_open_loop(endpoints, islice(schedule, worker_index, None, num_workers), worker_requests,
+                            request_config, stats, show_progress)
+    elif limiter is not None:
+        await run_adaptive_loop(endpoints, islice(request_plan, worker_index, None, num_workers), limiter,
+                                request_config, stats, worker_requests, show_progress)
+    else:
+        await run_closed_loop(endpoints, islice(request_plan, worker_index, None, num_workers),
+                              concurrency, request_config, stats, worker_requests,
+                              show_progress=show_progress)
+
+
+async def run_load(load_config, request_config, stats, worker_index=0, num_workers=1, start_at=None,
+                   show_progress=True, warmed_up=None, limiter=None):
+    """
+    Runs this process's share of the request schedule on its own sessions
+    and returns (elapsed_time, measured_start): the duration of the measured
+    part (after any warm-up) and the time.time() at which it began.
+    Worker `worker_index` of `num_workers` takes every num_workers-th request
+    of the global schedule (and its arrival time) plus an even share of the
+    concurrency. With `start_at` (a time.time() value) sending waits until
+    that moment, so that every worker starts together; `warmed_up` is
+    awaited between the warm-up and the measured run. With `limiter` the
+    closed loop adapts its concurrency instead.
+    """
+    concurrency = load_config['concurrency']
+    worker_concurrency = max(1, concurrency // num_workers + (worker_index < concurrency % num_workers))
+    if load_config['trace'] is not None or load_config['rate'] is not None:
+        # Open loop: no client-side cap on in-flight requests or connections.
+        connection_limit = 0
+    else:
+        connection_limit = worker_concurrency
+
+    trace_configs = [phase_trace_config()] if request_config['profile'] else None
+    async with EndpointPool(request_config['endpoints'], request_config['balancing'], connection_limit,
+                            request_config['timeout'], trace_configs) as endpoints:
+        if start_at is not None:
+            await asyncio.sleep(max(0.0, start_at - time.time()))
+        await run_warmup(endpoints, load_config, request_config, worker_concurrency, worker_index, num_workers,
+                         show_progress)
+        if warmed_up is not None:
+            await warmed_up()
+        measured_start = time.time()
+        start_time = time.monotonic()
+        await run_schedule(endpoints, load_config, request_config, stats, worker_concurrency, worker_index,
+                           num_workers, show_progress, limiter)
+        elapsed_time = time.monotonic() - start_time
+    return elapsed_time, measured_start
+
+
+def summarize_sweep_step(stats, elapsed_time, concurrency):
+    """Reduces one sweep step to throughput, tail latency, goodput and errors."""
+    overall = stats.overall
+    ttft = overall.histograms['time_to_first_token']
+    latency = overall.histograms['total_time']
+    itl = overall.histograms['inter_token_latency']
+    step = {
+        "concurrency": concurrency,
+        "requests": overall.requests,
+        "errors": overall.errors,
+        "error_types": dict(overall.error_types),
+        "output_tps": overall.completion_tokens / elapsed_time,
+        "goodput": overall.good_requests / elapsed_time,
+        "good_tps": overall.good_tokens / elapsed_time,
+        "meets_slo": False,
+    }
+    if overall.successes:
+        # Without streamed responses TTFT is not measured; it is shown as "-".
+        step.update({
+            "ttft_p50": ttft.percentile(50) if overall.streamed else None,
+            "ttft_p99": ttft.percentile(99) if overall.streamed else None,
+            "latency_p99": latency.percentile(99),
+        })
+        step["meets_slo"] = meets_slo(ttft.percentile(99), step['latency_p99'],
+                                      itl.percentile(99) if itl.count else None,
+                                      stats.slo_ttft, stats.slo_latency, stats.slo_itl)
+    return step
+
+
+def format_sweep_report(steps, has_slo):
+    """Builds the sweep table and names the chosen concurrency."""
+    lines = [
+        f"{'Conc':>6} {'Reqs':>6} {'Errors':>6} {'Out tok/s':>10} {'TTFT p50':>9} "
+        f"{'TTFT p99':>9} {'Lat p99':>9} {'Goodput':>8} {'Good tok/s':>10}  SLO"
+    ]
+    for step in sorted(steps, key=lambda s: s['concurrency']):
+        timings = " ".join(f"{step[key]:>8.4f}s" if step.get(key) is not None else f"{'-':>9}"
+                           for key in ("ttft_p50", "ttft_p99", "latency_p99"))
+        lines.append(
+            f"{step['concurrency']:>6} {step['requests']:>6} {step['errors']:>6} {step['output_tps']:>10.2f} "
+            f"{timings} {step['goodput']:>8.2f} {step['good_tps']:>10.2f}  {'ok' if step['meets_slo'] else 'FAIL'}"
+        )
+
+    lines.append("")
+    for step in sorted(steps, key=lambda s: s['concurrency']):
+        if step['errors']:
+            breakdown = ", ".join(f"{error_type} x{count}" for error_type, count in
+                                  sorted(step['error_types'].items(), key=lambda item: -item[1]))
+            lines.append(f"Concurrency {step['concurrency']} Errors: "
+                         f"{step['errors'] / step['requests']:.1%} ({breakdown})")
+    if has_slo:
+        passing = [s['concurrency'] for s in steps if s['meets_slo']]
+        if passing:
+            lines.append(f"Max Concurrency Meeting SLO: {max(passing)}")
+        else:
+            lines.append("Max Concurrency Meeting SLO: none")
+    else:
+        peak_tps = max(s['output_tps'] for s in steps)
+        knee = min(s['concurrency'] for s in steps if s['output_tps'] >= KNEE_FRACTION * peak_tps)
+        lines.append(f"Peak Output Throughput: {peak_tps:.2f} tok/s")
+        lines.append(f"Knee ({KNEE_FRACTION:.0%} of peak): concurrency {knee}")
+    return "\n".join(lines)
+
+
+def resolve_output_path(output_file):
+    """Returns the summary file path for this run, creating the output folder."""
     if not os.path.exists(OUTPUT_FOLDER):
         os.makedirs(OUTPUT_FOLDER)
-    
-    # Determine the final output path
-    if run_config['output_file']:
+
+    if output_file:
         # Use the filename provided via command-line argument
-        final_output_path = os.path.join(OUTPUT_FOLDER, run_config['output_file'])
-    else:
-        # Fallback to the default naming scheme with a timestamp
-        base_name = OUTPUT_FILENAME_BASE
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        final_output_path = os.path.join(OUTPUT_FOLDER, f"{base_name}_{timestamp}.txt")
+        return os.path.join(OUTPUT_FOLDER, output_file)
+    # Fallback to the default naming scheme with a timestamp
+    base_name = OUTPUT_FILENAME_BASE
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(OUTPUT_FOLDER, f"{base_name}_{timestamp}.txt")
+
+
+def records_path(output_path):
+    """Returns the per-request JSONL log path that goes with a summary file."""
+    return f"{os.path.splitext(output_path)[0]}_records.jsonl"
+
+
+def timeseries_path(output_path):
+    """Returns the time-series CSV path that goes with a summary file."""
+    return f"{os.path.splitext(output_path)[0]}_timeseries.csv"
+
+
+def save_profile(profiler, output_path, workers=1):
+    """Writes the --profile report and raw cProfile data next to a summary file."""
+    base = os.path.splitext(output_path)[0]
+    profiler.save(f"{base}_profile.txt", f"{base}_profile.prof")
+    lag = profiler.loop_lag.lag
+    if lag.count:
+        print(f"Event-Loop Lag: p50 {lag.percentile(50) * 1000:.2f}ms, p99 {lag.percentile(99) * 1000:.2f}ms, "
+              f"max {lag.max * 1000:.2f}ms")
+    if workers > 1:
+        print(f"cProfile and event-loop lag merged from this process and its {workers} load generators.")
+    print(f"Profile saved to '{base}_profile.txt' (raw cProfile data: '{base}_profile.prof').")
+
+
+def write_results_to_file(summary_text, run_config):
+    """Writes the final summary to a file."""
+    final_output_path = run_config['output_path']
 
     with open(final_output_path, "w") as f:
         f.write(summary_text)
 
     print(f"Results saved to '{final_output_path}'.")
 
-def process_and_display_results(results):
+def measure_window(path, run_config, slo, measured_start):
     """
-    Calculates final averages, prints them to the console,
-    and returns the summary string for file writing.
+    Re-reads a run's records and keeps the requests that finished inside the
+    measurement window: before the cool-down and, with steady-state
+    detection, within the span where throughput was stable. Times count
+    from `measured_start`, the time.time() at which the measured part began
+    (after any warm-up). Returns (stats, window length, description of the
+    window).
     """
-    successful_results = [r for r in results if r['status'] == 'success']
+    _, results = read_records(path)
+    finish_times = array('d')
+    for result in results:
+        finish_times.append(result['start_time'] - measured_start + (result.get('total_time') or 0.0))
+    run_end = max(finish_times, default=0.0)
+
+    start, end = 0.0, run_end - run_config['cooldown_seconds']
+    how = "whole run"
+    if run_config['cooldown_seconds']:
+        how = f"{run_config['cooldown_seconds']:g}s cool-down trimmed"
+    if run_config['steady_state']:
+        steady = steady_state_window([t for t in finish_times if t <= end])
+        if steady is None:
+            how += "; too few requests to detect a steady state"
+        else:
+            start, end = steady[0], min(end, steady[1])
+            how = "steady state" + ("" if how == "whole run" else f", {how}")
+
+    stats = BenchmarkStats(*slo)
+    _, results = read_records(path)
+    for result, finish_time in zip(results, finish_times):
+        if start <= finish_time <= end:
+            stats.add(result)
+    note = (f"Measurement Window: {start:.1f}s to {end:.1f}s of {run_end:.1f}s ({how}), "
+            f"{stats.overall.requests} of {len(finish_times)} requests")
+    return stats, end - start, note
+
 
-    if not successful_results:
-        print("\nBenchmark completed with no successful requests.")
+def cost_per_million_tokens(cost_per_hour, tokens_per_second):
+    """Returns the cost of a million tokens at `tokens_per_second` and `cost_per_hour`."""
+    return cost_per_hour / (tokens_per_second * 3600) * 1e6 if tokens_per_second > 0 else None
+
+
+def process_and_display_results(stats, elapsed_time=None, request_rate=None, window_note=None, cost_per_hour=None):
+    """
+    Calculates final averages and percentiles, prints them to the console,
+    and returns the summary string for file writing.
+    """
+    overall = stats.overall
+    if not overall.requests:
+        print("\nBenchmark completed with no requests.")
         return None
 
-    all_ttft = [r['time_to_first_token'] for r in successful_results]
-    all_tps = [r['tokens_per_second'] for r in successful_results]
+    # Create the summary string. Averages cover successful requests only, so
+    # the error rate and goodput are reported next to them.
+    if overall.successes:
+        # Without streaming the first token arrives with the last one.
+        first_line = f"Average Time to First Token: {overall.histograms['time_to_first_token'].mean:.4f}s" \
+            if overall.streamed else f"Average End-to-End Latency: {overall.histograms['total_time'].mean:.4f}s"
+        summary_lines = [
+            first_line,
+            f"Average Tokens per Second: {overall.histograms['tokens_per_second'].mean:.2f}"
+        ]
+        if overall.estimated_tokens:
+            summary_lines.append(f"Estimated Token Counts: {overall.estimated_tokens} of {overall.successes} "
+                                 f"responses had no usage block (use --tokenizer for exact counts)")
+    else:
+        summary_lines = ["No successful requests."]
+    if window_note:
+        summary_lines.insert(0, window_note)
+    summary_lines.append(f"Error Rate: {overall.errors / overall.requests:.1%} "
+                         f"({overall.errors} of {overall.requests} requests)")
+    if stats.has_slo and elapsed_time:
+        summary_lines.append(f"Goodput: {overall.good_requests / elapsed_time:.2f} req/s, "
+                             f"{overall.good_tokens / elapsed_time:.2f} tok/s within the SLO")
 
-    avg_ttft = sum(all_ttft) / len(all_ttft)
-    avg_tps = sum(all_tps) / len(all_tps)
-    
-    # Create the summary string
-    summary_lines = [
-        f"Average Time to First Token: {avg_ttft:.4f}s",
-        f"Average Tokens per Second: {avg_tps:.2f}"
-    ]
+    if elapsed_time:
+        output_tps = overall.completion_tokens / elapsed_time
+        summary_lines.append(f"Aggregate Throughput: {output_tps:.2f} output tok/s, "
+                             f"{(overall.prompt_tokens + overall.completion_tokens) / elapsed_time:.2f} total tok/s")
+        if cost_per_hour is not None and output_tps > 0:
+            summary_lines.append(f"Cost per 1M Output Tokens: ${cost_per_million_tokens(cost_per_hour, output_tps):.4f} "
+                                 f"(at ${cost_per_hour:g}/hour)")
+
+    if request_rate is not None:
+        summary_lines += [
+            f"Offered Request Rate: {request_rate:.2f} req/s",
+            f"Achieved Request Rate: {overall.successes / elapsed_time:.2f} req/s",
+        ]
+    if stats.schedule_lag.count:
+        summary_lines += [
+            f"Average Schedule Lag: {stats.schedule_lag.mean:.4f}s",
+            f"p99 Schedule Lag: {stats.schedule_lag.percentile(99):.4f}s",
+            f"Max Schedule Lag: {stats.schedule_lag.max:.4f}s",
+        ]
+    cold = stats.combined([COLD_PREFIX_CATEGORY])
+    warm = stats.combined([SHARED_PREFIX_CATEGORY, CONVERSATION_CATEGORY])
+    shared = stats.combined([SHARED_PREFIX_CATEGORY])
+    if cold.requests + shared.requests:
+        summary_lines.append(f"Achieved Prefix Reuse: {shared.requests / (cold.requests + shared.requests):.1%} "
+                             f"of {cold.requests + shared.requests} conversations")
+    if cold.successes and warm.successes:
+        metric, label = ("time_to_first_token", "TTFT") if overall.streamed else ("total_time", "Latency")
+        cold_ttft = cold.histograms[metric].percentile(50)
+        warm_ttft = warm.histograms[metric].percentile(50)
+        summary_lines += [
+            f"Cold-Prefix p50 {label}: {cold_ttft:.4f}s",
+            f"Reused-Prefix p50 {label}: {warm_ttft:.4f}s",
+            f"Prefix Cache {label} Saving: {1 - warm_ttft / cold_ttft:.1%}",
+        ]
+    summary_lines += ["", stats.format_report(elapsed_time=elapsed_time)]
     summary_text = "\n".join(summary_lines)
 
     # Print to console
@@ -349,44 +1063,285 @@ def process_and_display_results(results):
     return summary_text
 
 
+def build_load_config(cli_args):
+    """Determines what load to generate, overriding defaults with CLI args."""
+    final_seed = cli_args.seed if cli_args.seed is not None else SEED
+    if final_seed is None:
+        final_seed = random.randrange(2**32)
+
+    load_config = {
+        'workload': cli_args.workload if cli_args.workload is not None else WORKLOAD,
+        'input_lengths': cli_args.input_lengths if cli_args.input_lengths is not None else INPUT_LENGTHS,
+        'output_lengths': cli_args.output_lengths if cli_args.output_lengths is not None else OUTPUT_LENGTHS,
+        'prefix_tokens': cli_args.prefix_tokens if cli_args.prefix_tokens is not None else PREFIX_TOKENS,
+        'hit_ratio': cli_args.hit_ratio if cli_args.hit_ratio is not None else PREFIX_HIT_RATIO,
+        'turns': cli_args.turns if cli_args.turns is not None else CONVERSATION_TURNS,
+        'trace': cli_args.trace if cli_args.trace is not None else TRACE_FILE,
+        'time_scale': cli_args.time_scale if cli_args.time_scale is not None else TIME_SCALE,
+        'num_requests': cli_args.num_requests if cli_args.num_requests is not None else NUM_REQUESTS_PER_CATEGORY,
+        'concurrency': cli_args.concurrent_requests if cli_args.concurrent_requests is not None else MAX_CONCURRENT_REQUESTS,
+        'rate': cli_args.rate if cli_args.rate is not None else REQUEST_RATE,
+        'arrival': cli_args.arrival,
+        'burst_size': cli_args.burst_size,
+        'seed': final_seed,
+        'warmup_requests': cli_args.warmup if cli_args.warmup is not None else WARMUP_REQUESTS,
+        'warmup_seconds': cli_args.warmup_seconds if cli_args.warmup_seconds is not None else WARMUP_SECONDS,
+        'batch_size': 1,
+    }
+    if (cli_args.mode or REQUEST_MODE) == "batch":
+        load_config['batch_size'] = cli_args.batch_size if cli_args.batch_size is not None else BATCH_SIZE
+    if load_config['workload'] in ("synthetic", "prefix"):
+        try:
+            parse_distribution(load_config['input_lengths'])
+            parse_distribution(load_config['output_lengths'])
+        except ValueError as e:
+            raise SystemExit(str(e))
+    if load_config['time_scale'] <= 0:
+        raise SystemExit(f"--time_scale must be positive, got {load_config['time_scale']}.")
+    return load_config
+
+
+def build_slo(cli_args):
+    """Returns the (TTFT, latency, ITL) SLO limits, overriding defaults with CLI args."""
+    return (
+        cli_args.slo_ttft if cli_args.slo_ttft is not None else SLO_TTFT,
+        cli_args.slo_latency if cli_args.slo_latency is not None else SLO_LATENCY,
+        cli_args.slo_itl if cli_args.slo_itl is not None else SLO_ITL,
+    )
+
+
+def build_request_config(cli_args):
+    """Determines how each request is sent, overriding defaults with CLI args."""
+    try:
+        endpoints = parse_endpoints(cli_args.endpoints) if cli_args.endpoints is not None else ENDPOINTS
+    except ValueError as e:
+        raise SystemExit(str(e))
+    final_mode = cli_args.mode if cli_args.mode is not None else REQUEST_MODE
+    final_n = cli_args.n if cli_args.n is not None else N_CHOICES
+    if final_mode == "stream" and final_n != 1:
+        raise SystemExit("n > 1 is only supported with --mode non_stream or batch.")
+    if final_mode != "stream" and build_slo(cli_args)[0] is not None:
+        print(f"Warning: in {final_mode} mode the first token arrives with the whole response, "
+              f"so the TTFT SLO limits end-to-end latency.")
+    return {
+        'endpoints': endpoints or [(API_URL, 1.0)],
+        'mode': final_mode,
+        'n': final_n,
+        'balancing': cli_args.balancing if cli_args.balancing is not None else LOAD_BALANCING,
+        'model': cli_args.model if cli_args.model is not None else MODEL_NAME,
+        'timeout': cli_args.timeout if cli_args.timeout is not None else REQUEST_TIMEOUT,
+        'profile': cli_args.profile,
+        'max_tokens': cli_args.max_tokens if cli_args.max_tokens is not None else MAX_TOKENS,
+        'tokenizer_path': cli_args.tokenizer if cli_args.tokenizer is not None else TOKENIZER_FILE,
+        'capture_responses': STORE_RESPONSES or cli_args.store_responses,
+    }
+
+
 async def run_benchmark(cli_args):
     """Main function to set up and run the concurrent benchmark."""
     # Determine the final values, overriding defaults if CLI args are provided.
-    final_concurrent_requests = cli_args.concurrent_requests if cli_args.concurrent_requests is not None else MAX_CONCURRENT_REQUESTS
-    final_num_requests = cli_args.num_requests if cli_args.num_requests is not None else NUM_REQUESTS_PER_CATEGORY
-    final_max_tokens = cli_args.max_tokens if cli_args.max_tokens is not None else MAX_TOKENS
-    
+    load_config = build_load_config(cli_args)
+    request_config = build_request_config(cli_args)
+    final_concurrent_requests = load_config['concurrency']
+    final_rate = load_config['rate']
+    final_workers = cli_args.workers if cli_args.workers is not None else NUM_WORKERS
+    final_agents = cli_args.agents if cli_args.agents is not None else NUM_AGENTS
+    final_coordinator_port = cli_args.coordinator_port if cli_args.coordinator_port is not None else COORDINATOR_PORT
+    final_adaptive_ttft = cli_args.adaptive_ttft if cli_args.adaptive_ttft is not None else ADAPTIVE_TTFT
+    closed_loop = final_rate is None and load_config['trace'] is None
+    # In closed loop each process keeps at least one request in flight, so
+    # more of them than the concurrency would exceed it.
+    if closed_loop and final_workers > final_concurrent_requests:
+        print(f"Warning: {final_workers} workers for {final_concurrent_requests} concurrent requests; "
+              f"using {final_concurrent_requests} workers.")
+        final_workers = final_concurrent_requests
+    if closed_loop and final_agents > final_concurrent_requests:
+        raise SystemExit(f"--agents {final_agents} exceeds the {final_concurrent_requests} concurrent requests "
+                         f"they share; use fewer agents or raise -c.")
+    if final_adaptive_ttft is not None and (not closed_loop or final_workers > 1 or final_agents):
+        raise SystemExit("--adaptive_ttft needs a single-process closed-loop run (no --rate, --trace, "
+                         "--workers or --agents).")
+
     run_config = {
-        'output_file': cli_args.output_file,
+        'output_path': resolve_output_path(cli_args.output_file),
+        'write_records': WRITE_RECORDS and not cli_args.no_records,
+        'write_timeseries': WRITE_TIMESERIES,
+        'telemetry_interval': cli_args.telemetry_interval if cli_args.telemetry_interval is not None else TELEMETRY_INTERVAL,
+        'metrics_port': cli_args.metrics_port if cli_args.metrics_port is not None else METRICS_PORT,
+        'cooldown_seconds': cli_args.cooldown_seconds if cli_args.cooldown_seconds is not None else COOLDOWN_SECONDS,
+        'steady_state': STEADY_STATE or cli_args.steady_state,
+        'cost_per_hour': cli_args.cost_per_hour if cli_args.cost_per_hour is not None else COST_PER_HOUR,
     }
 
-    total_requests = final_num_requests * len(CATEGORIZED_PROMPTS)
     print("--- Starting Benchmark ---")
-    print(f"Total Requests: {total_requests}")
-    print(f"Concurrent Requests: {final_concurrent_requests}\n")
+    if load_config['trace'] is not None:
+        total_requests = None
+        print(f"Replaying Trace: {load_config['trace']} (time scale {load_config['time_scale']}x)")
+    else:
+        _, total_requests = build_request_plan(load_config)
+        print(f"Total Requests: {total_requests}")
+        if load_config['workload'] in ("synthetic", "prefix"):
+            print(f"Synthetic Lengths: input {load_config['input_lengths']}, output {load_config['output_lengths']}")
+        if load_config['workload'] == "prefix":
+            print(f"Shared Prefix: {load_config['prefix_tokens']} tokens, {load_config['hit_ratio']:.0%} reuse targeted, "
+                  f"{load_config['turns']} turn(s) per conversation")
+    if request_config['mode'] == "batch":
+        print(f"Request Mode: batch ({load_config['batch_size']} prompts per request, n={request_config['n']})")
+    elif request_config['mode'] == "non_stream":
+        print(f"Request Mode: non-streaming (n={request_config['n']})")
+    if len(request_config['endpoints']) > 1:
+        print(f"Endpoints: {len(request_config['endpoints'])} ({request_config['balancing']})")
+    if final_agents:
+        print(f"Agents: {final_agents} (coordinator port {final_coordinator_port})")
+    elif final_workers > 1:
+        print(f"Worker Processes: {final_workers}")
+    if load_config['trace'] is not None:
+        print()
+    elif final_rate is not None:
+        print(f"Arrival Rate: {final_rate} req/s ({cli_args.arrival})\n")
+    elif final_adaptive_ttft is not None:
+        print(f"Adaptive Concurrency: holding p95 TTFT at {final_adaptive_ttft}s, "
+              f"up to {final_concurrent_requests} in flight\n")
+    else:
+        print(f"Concurrent Requests: {final_concurrent_requests}\n")
 
-    semaphore = asyncio.Semaphore(final_concurrent_requests)
-    connector = aiohttp.TCPConnector(limit=final_concurrent_requests)
-    
-    async with aiohttp.ClientSession(connector=connector) as session:
-        tasks = []
-        for category, prompts in CATEGORIZED_PROMPTS.items():
-            prompt_iterator = cycle(prompts)
-            for i in range(final_num_requests):
-                prompt = next(prompt_iterator)
-                task = send_request(session, semaphore, prompt, category, i + 1, final_max_tokens)
-                tasks.append(task)
-        
-        results = await tqdm_asyncio.gather(*tasks, desc="Running benchmark")
-
-    summary_text = process_and_display_results(results)
+    stats = BenchmarkStats(*build_slo(cli_args))
+    records = None
+    if run_config['write_records']:
+        records = JsonlResultSink(records_path(run_config['output_path']),
+                                  {'load_config': load_config, 'request_config': request_config})
+    timeseries = TimeSeries(timeseries_path(run_config['output_path']) if run_config['write_timeseries'] else None,
+                            run_config['telemetry_interval'])
+    profiler = RunProfiler() if request_config['profile'] else None
+    limiter = AIMDLimiter(final_adaptive_ttft, final_concurrent_requests) if final_adaptive_ttft is not None else None
+    store = None
+    if request_config['capture_responses']:
+        final_store_max_bytes = cli_args.store_max_bytes if cli_args.store_max_bytes is not None else STORE_MAX_BYTES
+        store = ResponseStoreSink(ResponseStore(max_bytes=final_store_max_bytes),
+                                  cli_args.server_build if cli_args.server_build is not None else SERVER_BUILD)
+    # The store goes first: it moves the transcripts out of each result before it is logged.
+    sink = ResultFanout(*(s for s in (store, stats, records, timeseries, profiler and profiler.phases)
+                          if s is not None))
+    if run_config['metrics_port'] is not None:
+        print(f"Serving live metrics at http://localhost:{run_config['metrics_port']}/metrics\n")
+
+    if profiler is not None:
+        profiler.start()
+    try:
+        async with live_telemetry(timeseries, run_config['metrics_port']):
+            if final_agents:
+                elapsed_time, measured_start = await run_agents(
+                    final_agents, final_coordinator_port, load_config, request_config, sink, total_requests, profiler
+                )
+            elif final_workers > 1:
+                elapsed_time, measured_start = await asyncio.to_thread(
+                    run_workers, run_load, final_workers, load_config, request_config, sink, total_requests, profiler
+                )
+            else:
+                elapsed_time, measured_start = await run_load(load_config, request_config, sink, limiter=limiter)
+        if records is not None:
+            records.mark("measured", start_time=measured_start)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            save_profile(profiler, run_config['output_path'], final_agents or final_workers)
+        if store is not None:
+            store.close()
+        if timeseries.path:
+            print(f"Time series saved to '{timeseries.path}'.")
+        if records is not None:
+            records.close()
+            print(f"Per-request records saved to '{records.path}'.")
+            if WRITE_COLUMNAR and columnar_results.np is not None:
+                print(f"Columnar results saved to '{columnar_results.convert_records(records.path)}'.")
+
+    window_note = None
+    if run_config['cooldown_seconds'] or run_config['steady_state']:
+        if records is None:
+            print("Cool-down trim and steady-state detection need the per-request records; reporting the whole run.")
+        else:
+            stats, elapsed_time, window_note = measure_window(records.path, run_config, build_slo(cli_args),
+                                                              measured_start)
+    summary_text = process_and_display_results(stats, elapsed_time, final_rate, window_note,
+                                               run_config['cost_per_hour'])
+    if summary_text and store is not None:
+        print("\n" + store.format_report())
+        summary_text += "\n\n" + store.format_report()
+    if summary_text and limiter is not None:
+        adaptive_summary, adaptive_table = limiter.format_report()
+        print("\n" + "\n".join(adaptive_summary))
+        summary_text += "\n\n" + "\n".join(adaptive_summary + ["", "--- Adjustment Windows ---"] + adaptive_table)
     if summary_text:
         write_results_to_file(summary_text, run_config)
 
-if __name__ == "__main__":
-    # To run this script, you first need to install the required libraries:
-    # pip install aiohttp tqdm
+async def run_sweep(cli_args):
+    """
+    Runs the benchmark at each concurrency level on one set of warm sessions, either
+    over the whole ladder (--sweep) or as a binary search for the largest
+    concurrency that still meets the SLO (--search).
+    """
+    load_config = build_load_config(cli_args)
+    request_config = build_request_config(cli_args)
+    slo = build_slo(cli_args)
+    has_slo = any(limit is not None for limit in slo)
+    levels = [int(level) for level in cli_args.sweep_levels.split(",")] if cli_args.sweep_levels else SWEEP_LEVELS
+
+    if cli_args.search and not has_slo:
+        raise SystemExit("--search needs an SLO: pass --slo_ttft, --slo_latency and/or --slo_itl.")
+
+    run_config = {
+        'output_path': resolve_output_path(cli_args.output_file),
+    }
+
+    _, requests_per_step = build_request_plan(load_config)
+    print("--- Starting Concurrency Sweep ---")
+    print(f"Requests per Step: {requests_per_step}\n")
+
+    steps = {}
+    profiler = RunProfiler() if request_config['profile'] else None
+    trace_configs = [phase_trace_config()] if profiler is not None else None
+    async with EndpointPool(request_config['endpoints'], request_config['balancing'], max(levels),
+                            request_config['timeout'], trace_configs) as endpoints:
+        await run_warmup(endpoints, load_config, request_config, min(levels))
+        if profiler is not None:
+            profiler.start()
+
+        async def run_step(concurrency):
+            if concurrency not in steps:
+                stats = BenchmarkStats(*slo)
+                sink = ResultFanout(stats, profiler.phases) if profiler is not None else stats
+                start_time = time.monotonic()
+                request_plan, total_requests = build_request_plan(dict(load_config, concurrency=concurrency))
+                await run_closed_loop(endpoints, request_plan, concurrency, request_config, sink,
+                                      total_requests, desc=f"Concurrency {concurrency}")
+                steps[concurrency] = summarize_sweep_step(stats, time.monotonic() - start_time, concurrency)
+            return steps[concurrency]
+
+        if cli_args.search:
+            low, high = 1, max(levels)
+            while low < high:
+                mid = (low + high + 1) // 2
+                if (await run_step(mid))['meets_slo']:
+                    low = mid
+                else:
+                    high = mid - 1
+            await run_step(low)
+        else:
+            for concurrency in levels:
+                await run_step(concurrency)
+        if profiler is not None:
+            profiler.stop()
 
+    summary_text = format_sweep_report(list(steps.values()), has_slo)
+    print("\n--- Sweep Complete ---")
+    print(summary_text)
+    write_results_to_file(summary_text, run_config)
+    if profiler is not None:
+        save_profile(profiler, run_config['output_path'])
+
+
+def build_arg_parser():
+    """Returns the command-line parser; benchmark_matrix.py reuses it for matrix cells."""
     # Setup command-line argument parser
     parser = argparse.ArgumentParser(description="Run a concurrent benchmark test on an LLM API.")
     parser.add_argument("-o", "--output_file", type=str,
@@ -397,7 +1352,118 @@ if __name__ == "__main__":
                         help=f"The number of requests to send per category (default: {NUM_REQUESTS_PER_CATEGORY}).")
     parser.add_argument("-t", "--max_tokens", type=int,
                         help=f"The maximum number of tokens to generate per response (default: {MAX_TOKENS}).")
-    
+    parser.add_argument("-m", "--model", type=str,
+                        help=f"Model name sent with every request (default: {MODEL_NAME}).")
+    parser.add_argument("--mode", choices=["stream", "non_stream", "batch"],
+                        help=f"Send streaming requests, non-streaming ones, or multi-prompt batches to "
+                             f"/v1/completions (default: {REQUEST_MODE}).")
+    parser.add_argument("--batch_size", type=int,
+                        help=f"Prompts per request in --mode batch (default: {BATCH_SIZE}).")
+    parser.add_argument("--n", type=int,
+                        help=f"Completions per prompt (the `n` parameter) in the non-streaming modes "
+                             f"(default: {N_CHOICES}).")
+    parser.add_argument("--cost_per_hour", type=float,
+                        help="Hourly cost of the deployment, to report the cost per million output tokens.")
+    parser.add_argument("--endpoints", type=str,
+                        help="Comma-separated endpoint URLs to spread load over, each optionally URL=WEIGHT "
+                             "(default: API_URL).")
+    parser.add_argument("--balancing", choices=BALANCING_POLICIES,
+                        help=f"How requests are spread over --endpoints (default: {LOAD_BALANCING}).")
+    parser.add_argument("--tokenizer", type=str,
+                        help="Local tokenizer.json used to count tokens when the server sends no usage block.")
+    parser.add_argument("-r", "--rate", type=float,
+                        help="Send requests open-loop at this many requests per second, ignoring -c.")
+    parser.add_argument("--arrival", choices=["poisson", "constant", "burst"], default=ARRIVAL_PATTERN,
+                        help=f"Inter-arrival pattern used with --rate (default: {ARRIVAL_PATTERN}).")
+    parser.add_argument("--burst_size", type=int, default=BURST_SIZE,
+                        help=f"Requests fired together by the burst arrival pattern (default: {BURST_SIZE}).")
+    parser.add_argument("--trace", type=str,
+                        help="Replay a JSONL trace of {timestamp, messages, max_tokens, category} records.")
+    parser.add_argument("--time_scale", type=float,
+                        help=f"Speed-up factor for --trace replay, e.g. 2 or 10 (default: {TIME_SCALE}).")
+    parser.add_argument("--seed", type=int,
+                        help="Seed for the arrival schedule and synthetic workload (default: random).")
+    parser.add_argument("--workload", choices=["prompts", "synthetic", "prefix"],
+                        help=f"Request source: the built-in prompts, generated lengths, or generated prompts "
+                             f"behind shared prefixes (default: {WORKLOAD}).")
+    parser.add_argument("--input_lengths", type=str,
+                        help=f"Synthetic input-token distribution, e.g. fixed:2048, uniform:128:4096, "
+                             f"lognormal:512:0.8, empirical:128=3,2048=1 (default: {INPUT_LENGTHS}).")
+    parser.add_argument("--output_lengths", type=str,
+                        help=f"Synthetic max_tokens distribution, same format (default: {OUTPUT_LENGTHS}).")
+    parser.add_argument("--prefix_tokens", type=int,
+                        help=f"Shared system-prompt length for --workload prefix (default: {PREFIX_TOKENS}).")
+    parser.add_argument("--hit_ratio", type=float,
+                        help=f"Share of conversations reusing an earlier prefix (default: {PREFIX_HIT_RATIO}).")
+    parser.add_argument("--turns", type=int,
+                        help=f"User turns per conversation; each resends the history (default: {CONVERSATION_TURNS}).")
+    parser.add_argument("-w", "--workers", type=int,
+                        help=f"Split the run across this many processes, each with its own event loop (default: {NUM_WORKERS}).")
+    parser.add_argument("--agents", type=int,
+                        help=f"Coordinate this many agents and merge their results instead of generating the load "
+                             f"here (default: {NUM_AGENTS}).")
+    parser.add_argument("--coordinator_port", type=int,
+                        help=f"Port the coordinator listens on for agents (default: {COORDINATOR_PORT}).")
+    parser.add_argument("--agent", type=str, metavar="HOST:PORT",
+                        help="Run as an agent of the coordinator at HOST:PORT; the load settings come from it.")
+    parser.add_argument("--store_responses", action="store_true",
+                        help="Keep response transcripts in the deduplicated response store and flag changes.")
+    parser.add_argument("--server_build", type=str,
+                        help="Label of the server build under test. Responses that differ from those stored "
+                             "under another label are flagged as changed; without a label they count as varied. "
+                             "Only meaningful with deterministic decoding (temperature 0 or a fixed seed).")
+    parser.add_argument("--store_max_bytes", type=int,
+                        help=f"Size bound of the response store in bytes; least recently used responses are "
+                             f"evicted beyond it (default: {STORE_MAX_BYTES}).")
+    parser.add_argument("--no_records", action="store_true",
+                        help="Do not write the per-request JSONL log next to the summary file.")
+    parser.add_argument("--warmup", type=int,
+                        help=f"Warm-up requests sent first and left out of the statistics (default: {WARMUP_REQUESTS}).")
+    parser.add_argument("--warmup_seconds", type=float,
+                        help=f"Warm-up duration in seconds, left out of the statistics (default: {WARMUP_SECONDS}).")
+    parser.add_argument("--cooldown_seconds", type=float,
+                        help=f"Leave out requests finishing in the last N seconds of the run (default: {COOLDOWN_SECONDS}).")
+    parser.add_argument("--steady_state", action="store_true",
+                        help="Report only the window where throughput has stabilized.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile the client: cProfile, event-loop lag and per-phase request timings, "
+                             "written next to the results.")
+    parser.add_argument("--telemetry_interval", type=float,
+                        help=f"Seconds per row of the time-series CSV (default: {TELEMETRY_INTERVAL}).")
+    parser.add_argument("--metrics_port", type=int,
+                        help="Serve live OpenMetrics at http://localhost:PORT/metrics during the run.")
+    parser.add_argument("--adaptive_ttft", type=float,
+                        help="Adapt the requests in flight (up to -c) to hold this p95 TTFT in seconds, and report "
+                             "the concurrency it converges to.")
+    parser.add_argument("--sweep", action="store_true",
+                        help="Run every concurrency level in the sweep ladder and report the knee.")
+    parser.add_argument("--search", action="store_true",
+                        help="Binary-search for the largest concurrency that meets the SLO.")
+    parser.add_argument("--sweep_levels", type=str,
+                        help=f"Comma-separated concurrency ladder (default: {','.join(map(str, SWEEP_LEVELS))}).")
+    parser.add_argument("--slo_ttft", type=float,
+                        help="Time-to-first-token limit in seconds for goodput and the sweep SLO.")
+    parser.add_argument("--slo_latency", type=float,
+                        help="End-to-end latency limit in seconds for goodput and the sweep SLO.")
+    parser.add_argument("--slo_itl", type=float,
+                        help="p99 inter-token latency limit in seconds for goodput and the sweep SLO.")
+    parser.add_argument("--timeout", type=float,
+                        help="Per-request deadline in seconds; late requests count as TimeoutError errors.")
+    return parser
+
+
+if __name__ == "__main__":
+    # To run this script, you first need to install the required libraries:
+    # pip install aiohttp tqdm
+
+    parser = build_arg_parser()
     args = parser.parse_args()
 
-    asyncio.run(run_benchmark(cli_args=args))
\ No newline at end of file
+    if args.agent:
+        asyncio.run(run_agent(run_load, args.agent))
+    elif args.sweep or args.search:
+        if args.agents:
+            parser.error("--agents cannot be combined with --sweep or --search.")
+        asyncio.run(run_sweep(cli_args=args))
+    else:
+        asyncio.run(run_benchmark(cli_args=args))
\ No newline at end of file
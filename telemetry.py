@@ -0,0 +1,227 @@
+"""
+Live time-series telemetry for a running benchmark.
+
+A TimeSeries is a result sink that buckets completed requests by the wall
+clock second (or other interval) they finished in. Each bucket is written to
+a CSV as soon as it closes, together with rolling-window figures over the
+last few buckets, so warm-up, throttling or slow degradation show up over
+time instead of disappearing into the final averages. The same rolling
+figures can be served in OpenMetrics text format for scraping while the run
+is going.
+"""
+import asyncio
+import csv
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from aiohttp import web
+
+from benchmark_stats import LogHistogram
+
+# Closed buckets kept for the rolling window (window length = interval * this).
+ROLLING_BUCKETS = 10
+
+# Results can arrive this long (seconds) after they finished, e.g. batched by
+# worker processes, before their bucket is closed.
+CLOSE_DELAY = 2.0
+
+CSV_COLUMNS = (
+    "time", "elapsed", "requests", "errors", "request_rate", "output_tps", "est_concurrency",
+    "ttft_p50", "ttft_p99", "latency_p99",
+    "rolling_request_rate", "rolling_output_tps", "rolling_ttft_p50", "rolling_ttft_p99",
+)
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class Bucket:
+    """Counters and latency histograms for one interval of the run."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.completion_tokens = 0
+        # Summed latency of the requests that succeeded in the bucket. Divided
+        # by the bucket length it estimates the mean concurrency (Little's law);
+        # only an estimate, since a request counts wholly towards the bucket
+        # it finished in and failed requests are left out.
+        self.busy_time = 0.0
+        self.ttft = LogHistogram(relative_error=0.02)
+        self.latency = LogHistogram(relative_error=0.02)
+
+    def add(self, result):
+        self.requests += 1
+        if result['status'] != 'success':
+            self.errors += 1
+            return
+        self.completion_tokens += result['completion_tokens']
+        self.busy_time += result['total_time']
+        self.ttft.record(result['time_to_first_token'])
+        self.latency.record(result['total_time'])
+
+    def merge(self, other):
+        self.requests += other.requests
+        self.errors += other.errors
+        self.completion_tokens += other.completion_tokens
+        self.busy_time += other.busy_time
+        self.ttft.merge(other.ttft)
+        self.latency.merge(other.latency)
+
+
+class TimeSeries:
+    """
+    Result sink that keeps per-interval buckets and a rolling window over
+    the most recent ones, writing each closed bucket as a CSV row to `path`
+    (if given). Results may be added from another thread.
+    """
+
+    def __init__(self, path=None, interval=1.0, rolling_buckets=ROLLING_BUCKETS):
+        self.interval = interval
+        self.origin = time.time()
+        self.lock = threading.Lock()
+        self.open_buckets = {}
+        self.next_index = 0
+        self.recent = deque(maxlen=rolling_buckets)
+        self.totals = Bucket()
+        self.path = path
+        self.file = open(path, "w", newline="") if path else None
+        self.writer = csv.writer(self.file) if path else None
+        if self.writer:
+            self.writer.writerow(CSV_COLUMNS)
+
+    def add(self, result):
+        finished = time.time()
+        if result.get('start_time') is not None and result.get('total_time') is not None:
+            finished = result['start_time'] + result['total_time']
+        # Results for a bucket that has already closed go into the oldest open one.
+        index = max(int((finished - self.origin) // self.interval), self.next_index)
+        with self.lock:
+            self.open_buckets.setdefault(index, Bucket()).add(result)
+            self.totals.add(result)
+
+    def tick(self, now=None):
+        """Closes every bucket that ended more than CLOSE_DELAY seconds before `now`."""
+        now = time.time() if now is None else now
+        self._close_until(int((now - CLOSE_DELAY - self.origin) // self.interval))
+
+    def close(self):
+        """Closes all remaining buckets and the CSV file."""
+        with self.lock:
+            last = max(self.open_buckets, default=self.next_index - 1)
+        self._close_until(last + 1)
+        if self.file:
+            self.file.close()
+
+    def _close_until(self, end_index):
+        with self.lock:
+            buckets = [(index, self.open_buckets.pop(index, None) or Bucket())
+                       for index in range(self.next_index, end_index)]
+            self.next_index = max(self.next_index, end_index)
+        for index, bucket in buckets:
+            with self.lock:
+                self.recent.append(bucket)
+                rolling = self.rolling()
+            if self.writer:
+                self.writer.writerow(self._row(index, bucket, rolling))
+        if buckets and self.file:
+            self.file.flush()
+
+    def rolling(self):
+        """Returns (bucket, seconds) merging the recent closed buckets."""
+        window = Bucket()
+        for bucket in self.recent:
+            window.merge(bucket)
+        return window, len(self.recent) * self.interval
+
+    def _row(self, index, bucket, rolling):
+        window, seconds = rolling
+        end = self.origin + (index + 1) * self.interval
+        return [
+            time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(end)), f"{(index + 1) * self.interval:g}",
+            bucket.requests, bucket.errors,
+            f"{bucket.requests / self.interval:.3f}", f"{bucket.completion_tokens / self.interval:.2f}",
+            f"{bucket.busy_time / self.interval:.2f}",
+            _quantile(bucket.ttft, 50), _quantile(bucket.ttft, 99), _quantile(bucket.latency, 99),
+            f"{window.requests / seconds:.3f}", f"{window.completion_tokens / seconds:.2f}",
+            _quantile(window.ttft, 50), _quantile(window.ttft, 99),
+        ]
+
+    def format_openmetrics(self):
+        """Returns the run totals and rolling-window figures as OpenMetrics text."""
+        with self.lock:
+            window, seconds = self.rolling()
+            totals = self.totals
+            lines = [
+                "# TYPE benchmark_requests counter",
+                "# HELP benchmark_requests Completed requests by outcome.",
+                f'benchmark_requests_total{{status="success"}} {totals.requests - totals.errors}',
+                f'benchmark_requests_total{{status="error"}} {totals.errors}',
+                "# TYPE benchmark_output_tokens counter",
+                f"benchmark_output_tokens_total {totals.completion_tokens}",
+            ]
+        rate = window.requests / seconds if seconds else 0.0
+        tps = window.completion_tokens / seconds if seconds else 0.0
+        concurrency = window.busy_time / seconds if seconds else 0.0
+        lines += [
+            "# TYPE benchmark_request_rate gauge",
+            "# HELP benchmark_request_rate Requests completed per second over the rolling window.",
+            f"benchmark_request_rate {rate:.6g}",
+            "# TYPE benchmark_output_tokens_per_second gauge",
+            f"benchmark_output_tokens_per_second {tps:.6g}",
+            "# TYPE benchmark_estimated_concurrency gauge",
+            "# HELP benchmark_estimated_concurrency Mean requests in flight over the rolling window, "
+            "estimated from the latency of completed requests (Little's law).",
+            f"benchmark_estimated_concurrency {concurrency:.6g}",
+            "# TYPE benchmark_time_to_first_token_seconds gauge",
+            "# UNIT benchmark_time_to_first_token_seconds seconds",
+            "# HELP benchmark_time_to_first_token_seconds TTFT percentile p over the rolling window.",
+        ]
+        for pct in (50, 90, 99):
+            value = window.ttft.percentile(pct) if window.ttft.count else math.nan
+            lines.append(f'benchmark_time_to_first_token_seconds{{p="{pct}"}} {_metric_value(value)}')
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _metric_value(value):
+    """Formats a sample value; OpenMetrics spells a missing one NaN."""
+    return "NaN" if math.isnan(value) else f"{value:.6g}"
+
+
+def _quantile(histogram, pct):
+    return f"{histogram.percentile(pct):.4f}" if histogram.count else ""
+
+
+@asynccontextmanager
+async def live_telemetry(timeseries, port=None):
+    """
+    Closes `timeseries` buckets on schedule for the duration of the block and,
+    with `port`, serves them at http://localhost:PORT/metrics.
+    """
+    async def tick():
+        while True:
+            await asyncio.sleep(timeseries.interval)
+            timeseries.tick()
+
+    async def metrics(request):
+        return web.Response(body=timeseries.format_openmetrics().encode(),
+                            headers={"Content-Type": OPENMETRICS_CONTENT_TYPE})
+
+    runner = None
+    if port is not None:
+        app = web.Application()
+        app.router.add_get("/metrics", metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "localhost", port).start()
+    ticker = asyncio.create_task(tick())
+    try:
+        yield timeseries
+    finally:
+        ticker.cancel()
+        if runner is not None:
+            await runner.cleanup()
+        timeseries.close()
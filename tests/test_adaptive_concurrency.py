@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+from adaptive_concurrency import AIMDLimiter
+
+
+def result(ttft=0.1, status="success"):
+    return {"status": status, "start_time": time.time(), "time_to_first_token": ttft, "completion_tokens": 10}
+
+
+async def send_window(limiter, **kwargs):
+    """Sends one full adjustment window, one request at a time."""
+    for _ in range(max(limiter.min_samples, limiter.limit)):
+        await limiter.acquire()
+        limiter.release(result(**kwargs))
+
+
+def test_slow_start_then_additive_increase_and_multiplicative_decrease():
+    async def scenario():
+        limiter = AIMDLimiter(target=0.5, max_limit=64, min_samples=5)
+        limits = []
+        for ttft in (0.1, 0.1, 0.1, 0.9, 0.1, 0.1):
+            await send_window(limiter, ttft=ttft)
+            limits.append(limiter.limit)
+        return limiter, limits
+
+    limiter, limits = asyncio.run(scenario())
+    # Doubling until the first miss, cut by ADAPTIVE_DECREASE, then one at a time.
+    assert limits == [2, 4, 8, 6, 7, 8]
+    assert [window['limit'] for window in limiter.history] == [1, 2, 4, 8, 6, 7]
+    assert not limiter.slow_start
+
+
+def test_errors_decrease_and_limits_are_bounded():
+    async def scenario():
+        limiter = AIMDLimiter(target=0.5, max_limit=3, initial_limit=3, min_samples=4)
+        await send_window(limiter, status="error")
+        after_errors = limiter.limit
+        for _ in range(5):
+            await send_window(limiter, ttft=5.0)
+        floor = limiter.limit
+        for _ in range(5):
+            await send_window(limiter, ttft=0.1)
+        return after_errors, floor, limiter.limit
+
+    after_errors, floor, ceiling = asyncio.run(scenario())
+    assert after_errors == 2
+    assert floor == 1
+    assert ceiling == 3
+
+
+def test_acquire_waits_for_a_free_slot():
+    async def scenario():
+        limiter = AIMDLimiter(target=0.5, max_limit=4, initial_limit=2)
+        await limiter.acquire()
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        blocked = not waiter.done()
+        limiter.release(result())
+        await asyncio.wait_for(waiter, 1)
+        return blocked, limiter.in_flight
+
+    blocked, in_flight = asyncio.run(scenario())
+    assert blocked
+    assert in_flight == 2
+
+
+def test_discard_frees_a_slot_without_a_sample():
+    async def scenario():
+        limiter = AIMDLimiter(target=0.5, max_limit=4, initial_limit=1, min_samples=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        blocked = not waiter.done()
+        limiter.discard()
+        await asyncio.wait_for(waiter, 1)
+        return blocked, limiter
+
+    blocked, limiter = asyncio.run(scenario())
+    assert blocked
+    assert limiter.in_flight == 1
+    # A request without a result is neither a TTFT sample nor an error.
+    assert limiter.ttft.count == 0 and limiter.errors == 0
+    assert limiter.limit == 1 and not limiter.history
@@ -0,0 +1,56 @@
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from analyze_results import bootstrap_relative_deltas, mann_whitney_p, take_requests
+
+
+def test_mann_whitney_separated_samples():
+    # U = 0 for n1 = n2 = 5: z = -12.5 / sqrt(25 / 12 * 11), p = erfc(|z| / sqrt(2)).
+    p = mann_whitney_p(np.arange(1.0, 6.0), np.arange(6.0, 11.0))
+    assert math.isclose(p, 0.009023, rel_tol=1e-3)
+    assert math.isclose(mann_whitney_p(np.arange(6.0, 11.0), np.arange(1.0, 6.0)), p)
+
+
+def test_mann_whitney_identical_and_tied_samples():
+    values = np.array([1.0, 2.0, 2.0, 3.0, 5.0, 8.0])
+    assert math.isclose(mann_whitney_p(values, values), 1.0)
+    # Every value tied: no variance left, so no evidence of a difference.
+    assert mann_whitney_p(np.ones(10), np.ones(12)) == 1.0
+
+
+def test_mann_whitney_detects_a_shift():
+    rng = np.random.default_rng(4)
+    base = rng.lognormal(0.0, 0.3, 500)
+    assert mann_whitney_p(base, rng.lognormal(0.0, 0.3, 500)) > 0.01
+    assert mann_whitney_p(base, rng.lognormal(0.1, 0.3, 500)) < 1e-4
+
+
+def test_bootstrap_interval_covers_the_true_change():
+    rng = np.random.default_rng(5)
+    base = rng.lognormal(0.0, 0.2, 2000)
+    intervals = bootstrap_relative_deltas((base, None), (base * 1.2, None), [50, 90], np.random.default_rng(6),
+                                          iterations=300)
+    for pct in (50, 90):
+        low, high = intervals[pct]
+        assert low < 0.2 < high
+        assert high - low < 0.1
+
+    same = bootstrap_relative_deltas((base, None), (base, None), [50], np.random.default_rng(7), iterations=300)
+    assert same[50][0] <= 0.0 <= same[50][1]
+
+
+def test_resampling_keeps_each_requests_gaps_together():
+    # Request 0 has gaps [1, 1, 1], request 1 has [3, 3].
+    values = np.array([1.0, 1.0, 1.0, 3.0, 3.0])
+    offsets = np.array([0, 3, 5])
+    picked, picked_offsets = take_requests(values, offsets, np.array([1, 1, 0]))
+    assert picked.tolist() == [3.0, 3.0, 3.0, 3.0, 1.0, 1.0, 1.0]
+    assert picked_offsets.tolist() == [0, 2, 4, 7]
+
+    intervals = bootstrap_relative_deltas((values, offsets), (values * 2, offsets), [50], np.random.default_rng(8),
+                                          iterations=200)
+    low, high = intervals[50]
+    assert low <= 1.0 <= high
@@ -0,0 +1,39 @@
+import pytest
+
+from benchmark_matrix import build_cell, expand_matrix
+
+CONFIG = {
+    "settings": {"num_requests": 20},
+    "matrix": {
+        "model": ["org/model-a", "org/model-b"],
+        "concurrent_requests": [8, 32],
+        "workload": ["prompts", {"name": "long-input", "workload": "synthetic", "input_lengths": "fixed:4096"}],
+    },
+}
+
+
+def test_expand_matrix_crosses_the_axes_in_order():
+    cells = expand_matrix(CONFIG)
+    assert len(cells) == 8
+    labels, options = cells[1]
+    assert labels == {"model": "org/model-a", "concurrent_requests": 8, "workload": "long-input"}
+    assert options == {"num_requests": 20, "model": "org/model-a", "concurrent_requests": 8,
+                       "workload": "synthetic", "input_lengths": "fixed:4096"}
+
+
+def test_cache_keys_are_stable_and_distinct():
+    keys = [build_cell(*cell)['key'] for cell in expand_matrix(CONFIG)]
+    assert keys == [build_cell(*cell)['key'] for cell in expand_matrix(CONFIG)]
+    assert len(set(keys)) == len(keys)
+    # Labels and the cost only affect the report, not what is measured.
+    labels, options = expand_matrix(CONFIG)[0]
+    assert build_cell({"model": "renamed"}, dict(options, cost_per_hour=12.5))['key'] == keys[0]
+    # Spelling out a default gives the same configuration and key.
+    assert build_cell(labels, dict(options, seed=0))['key'] == keys[0]
+
+
+def test_run_level_options_are_rejected():
+    with pytest.raises(SystemExit, match="not supported in a matrix"):
+        build_cell({}, {"workers": 4})
+    with pytest.raises(SystemExit, match="Unknown option"):
+        build_cell({}, {"no_such_option": 1})
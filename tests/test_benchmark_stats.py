@@ -0,0 +1,107 @@
+import math
+import random
+
+from benchmark_stats import BenchmarkStats, LogHistogram, decode_metrics, meets_slo, steady_state_window
+
+
+def exact_percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+
+def test_percentiles_within_relative_error():
+    rng = random.Random(1)
+    samples = [rng.lognormvariate(-3, 1.5) for _ in range(20000)]
+    histogram = LogHistogram()
+    for value in samples:
+        histogram.record(value)
+
+    for pct in (1, 50, 90, 99, 99.9, 100):
+        exact = exact_percentile(samples, pct)
+        assert abs(histogram.percentile(pct) - exact) <= histogram.relative_error * exact * 1.0001
+    assert histogram.count == len(samples)
+    assert histogram.min == min(samples) and histogram.max == max(samples)
+    assert math.isclose(histogram.mean, sum(samples) / len(samples))
+
+
+def test_merge_matches_recording_everything():
+    rng = random.Random(2)
+    parts = [[rng.expovariate(10) for _ in range(1000)] for _ in range(3)]
+    merged, whole = LogHistogram(), LogHistogram()
+    for part in parts:
+        histogram = LogHistogram()
+        for value in part:
+            histogram.record(value)
+            whole.record(value)
+        merged.merge(histogram)
+
+    assert merged.counts == whole.counts
+    assert merged.count == whole.count
+    assert (merged.min, merged.max) == (whole.min, whole.max)
+    assert math.isclose(merged.total, whole.total)
+    for pct in (50, 99):
+        assert merged.percentile(pct) == whole.percentile(pct)
+
+
+def test_merge_rejects_other_layouts():
+    try:
+        LogHistogram().merge(LogHistogram(relative_error=0.05))
+    except ValueError:
+        return
+    raise AssertionError("merging different bucket layouts should fail")
+
+
+def test_empty_histogram():
+    histogram = LogHistogram()
+    assert histogram.percentile(99) == 0.0
+    assert histogram.mean == 0.0
+
+
+def test_decode_metrics_from_chunk_offsets():
+    metrics = decode_metrics([0.5, 0.6, 0.65, 0.95, 1.0], completion_tokens=9)
+    # Four gaps (0.1, 0.05, 0.3, 0.05) over 8 tokens after the first.
+    assert math.isclose(metrics['time_per_output_token'], 0.5 / 8)
+    assert math.isclose(metrics['itl_p50'], 0.05)
+    assert math.isclose(metrics['itl_p99'], 0.3)
+    assert math.isclose(metrics['max_stall'], 0.3)
+    assert decode_metrics([0.5], completion_tokens=1) == {}
+    assert decode_metrics([], completion_tokens=0) == {}
+
+
+def test_meets_slo_checks_only_the_limits_that_are_set():
+    assert meets_slo(0.5, 2.0, 0.05, None, None, None)
+    assert meets_slo(0.5, 2.0, 0.05, 0.5, 2.0, 0.05)
+    assert not meets_slo(0.6, 2.0, 0.05, 0.5, None, None)
+    assert not meets_slo(0.5, 2.1, 0.05, None, 2.0, None)
+    assert not meets_slo(0.5, 2.0, 0.06, None, None, 0.05)
+    # A single-chunk response has no ITL to hold against the limit.
+    assert meets_slo(0.5, 2.0, None, None, None, 0.05)
+
+
+def test_goodput_counts_successes_within_the_slo():
+    stats = BenchmarkStats(slo_ttft=0.5)
+    for ttft, status in ((0.1, "success"), (0.9, "success"), (0.2, "error")):
+        result = {"status": status, "category": "c", "error_type": "HTTP 500"}
+        if status == "success":
+            result.update(time_to_first_token=ttft, total_time=1.0, tokens_per_second=10.0, completion_tokens=10)
+        stats.add(result)
+    assert stats.has_slo
+    assert (stats.overall.requests, stats.overall.good_requests, stats.overall.good_tokens) == (3, 1, 10)
+
+
+def test_steady_state_window_skips_ramp_up_and_drain():
+    # 20 one-second slices: 2 slow slices, 16 at 50 completions, 2 slow again.
+    finish_times = []
+    for second in range(20):
+        count = 10 if second in (0, 1, 18, 19) else 50
+        finish_times += [second + (i + 0.5) / count for i in range(count)]
+    start, end = steady_state_window(finish_times)
+    assert math.isclose(start, 2 * max(finish_times) / 20)
+    assert math.isclose(end, 18 * max(finish_times) / 20)
+
+
+def test_steady_state_window_needs_enough_requests():
+    assert steady_state_window([1.0] * 99) is None
+    assert steady_state_window([0.0] * 200) is None
+    # Finish times before the measured start (clock skew) land in the first slice.
+    assert steady_state_window([-0.1] + [float(i % 10) + 0.5 for i in range(200)]) is not None
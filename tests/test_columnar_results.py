@@ -0,0 +1,54 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from analyze_results import select_rows, summarize_rows
+from columnar_results import convert_records, load_columns
+from result_sink import JsonlResultSink
+
+
+def write_run(path, mode="stream"):
+    """Logs three requests after a 5s warm-up: two successes (one from a second backend) and an error."""
+    sink = JsonlResultSink(str(path), {"request_config": {"mode": mode}})
+    measured_start = 1000.0
+    sink.add({"status": "success", "category": "reasoning", "backend": "a", "request_num": 1,
+              "start_time": measured_start + 0.5, "time_to_first_token": 0.1, "total_time": 0.4,
+              "completion_tokens": 4, "chunk_times": [0.1, 0.2, 0.25, 0.4]})
+    sink.add({"status": "success", "category": "coding", "backend": "b", "request_num": 1,
+              "start_time": measured_start + 1.0, "time_to_first_token": 0.3, "total_time": 0.3,
+              "completion_tokens": 1, "chunk_times": [0.3], "prompt_tokens": None})
+    sink.add({"status": "error", "category": "reasoning", "backend": "a", "request_num": 2,
+              "start_time": measured_start + 2.0, "error": "boom", "error_type": "HTTP 500"})
+    sink.mark("measured", start_time=measured_start)
+    sink.close()
+
+
+def test_npz_round_trip(tmp_path):
+    write_run(tmp_path / "run_records.jsonl")
+    columns = load_columns(convert_records(str(tmp_path / "run_records.jsonl")))
+
+    assert list(columns["success"]) == [True, True, False]
+    assert [columns["category_names"][code] for code in columns["category"]] == ["reasoning", "coding", "reasoning"]
+    assert [columns["backend_names"][code] for code in columns["backend"]] == ["a", "b", "a"]
+    assert list(columns["error_type"]) == [-1, -1, 0] and list(columns["error_type_names"]) == ["HTTP 500"]
+    # Offsets count from the measured start, not from when the log was opened.
+    assert np.allclose(columns["start_offset"], [0.5, 1.0, 2.0])
+    assert list(columns["prompt_tokens"]) == [-1, -1, -1]
+    assert np.isnan(columns["time_to_first_token"][2])
+    # Request i's gaps are itl_values[itl_offsets[i]:itl_offsets[i + 1]].
+    assert list(columns["itl_offsets"]) == [0, 3, 3, 3]
+    assert np.allclose(columns["itl_values"], [0.1, 0.05, 0.15])
+
+    window = select_rows(columns, start=0.75)
+    assert list(window) == [False, True, True]
+
+
+def test_ttft_is_left_out_without_streaming(tmp_path):
+    write_run(tmp_path / "stream_records.jsonl")
+    write_run(tmp_path / "batch_records.jsonl", mode="batch")
+    streamed = load_columns(str(tmp_path / "stream_records.jsonl"))
+    batched = load_columns(str(tmp_path / "batch_records.jsonl"))
+
+    assert "time_to_first_token" in summarize_rows(streamed, select_rows(streamed))
+    assert "time_to_first_token" not in summarize_rows(batched, select_rows(batched))
+    assert "total_time" in summarize_rows(batched, select_rows(batched))
@@ -0,0 +1,12 @@
+import json
+
+from distributed import RESULT_FIELDS, pack_result, unpack_result
+
+
+def test_results_survive_a_json_round_trip():
+    result = {"status": "success", "total_time": 1.5, "chunk_times": [0.1, 0.2], "phases": {"send": 0.01}}
+    record = json.loads(json.dumps(pack_result(result)))
+    assert len(record) == len(RESULT_FIELDS)
+    unpacked = unpack_result(record)
+    assert {field: unpacked[field] for field in result} == result
+    assert unpacked["error"] is None and set(unpacked) == set(RESULT_FIELDS)
@@ -0,0 +1,52 @@
+import pytest
+
+from endpoint_pool import EndpointPool, parse_endpoints
+
+URLS = ["http://a:8000/v1/chat/completions", "http://b:8000/v1/chat/completions", "http://c:8000/v1/chat/completions"]
+
+
+def picks(pool, count, release=True):
+    names = []
+    for _ in range(count):
+        endpoint = pool.acquire()
+        names.append(endpoint.name)
+        if release:
+            pool.release(endpoint)
+    return "".join(name[0] for name in names)
+
+
+def test_parse_endpoints():
+    assert parse_endpoints(f"{URLS[0]}=3, {URLS[1]}") == [(URLS[0], 3.0), (URLS[1], 1.0)]
+    with pytest.raises(ValueError):
+        parse_endpoints(f"{URLS[0]}=0")
+
+
+def test_round_robin():
+    pool = EndpointPool([(url, 1.0) for url in URLS])
+    assert picks(pool, 7) == "abcabca"
+
+
+def test_least_outstanding_prefers_idle_endpoints():
+    pool = EndpointPool([(url, 1.0) for url in URLS], "least_outstanding")
+    # Nothing finishes: each endpoint gets one request before any gets a second.
+    assert picks(pool, 6, release=False) == "abcabc"
+    busy = pool.endpoints[1]
+    for endpoint in pool.endpoints:
+        while endpoint.outstanding > (1 if endpoint is busy else 0):
+            pool.release(endpoint)
+    # "b" still has a request in flight, so the idle ones take turns.
+    assert picks(pool, 4) == "acac"
+
+
+def test_smooth_weighted_round_robin():
+    pool = EndpointPool([(URLS[0], 5.0), (URLS[1], 1.0), (URLS[2], 1.0)], "weighted")
+    # Each endpoint's share is spread evenly instead of sent in a burst.
+    assert picks(pool, 7) == "aabacaa"
+    assert picks(pool, 700).count("a") == 500
+
+
+def test_endpoints_are_named_by_host_unless_hosts_repeat():
+    pool = EndpointPool([(URLS[0], 1.0), ("http://a:8000/v1/completions", 1.0), (URLS[1], 1.0)])
+    assert [e.name for e in pool.endpoints] == [URLS[0], "http://a:8000/v1/completions", "b:8000"]
+    with pytest.raises(ValueError):
+        EndpointPool([(URLS[0], 1.0)], "random")
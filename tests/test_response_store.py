@@ -0,0 +1,81 @@
+import itertools
+import os
+
+import response_store
+from response_store import ResponseStore, ResponseStoreSink, request_key
+
+
+def request(prompt):
+    return {"model": "m", "messages": [{"role": "user", "content": prompt}], "max_tokens": 16}
+
+
+def blob_count(store):
+    return store.db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+
+
+def test_statuses_and_deduplication(tmp_path):
+    store = ResponseStore(str(tmp_path))
+    assert store.put(request("a"), "same answer", "v1") == (request_key(request("a")), "new")
+    assert store.put(request("b"), "same answer", "v1")[1] == "new"
+    # Two request blobs and one shared response blob.
+    assert blob_count(store) == 3
+    assert store.put(request("a"), "same answer", "v1")[1] == "unchanged"
+    assert store.put(request("a"), "sampled differently", "v1")[1] == "varied"
+    assert store.put(request("a"), "new build answer", "v2")[1] == "changed"
+
+    entry = store.find(request_key(request("a"))[:12])
+    assert store.read_blob(entry['response']) == "new build answer"
+    assert store.read_blob(entry['previous_response']) == "sampled differently"
+    assert entry['previous_build'] == "v1"
+    store.close()
+
+
+def test_least_recently_used_blobs_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(response_store.time, "time", lambda: float(next(clock)))
+    store = ResponseStore(str(tmp_path), max_bytes=10 ** 9)
+    keys = [store.put(request(prompt), f"answer {prompt} " + "x" * 100, "v1")[0] for prompt in "abc"]
+    store.commit()
+    # Reading "a" makes it the most recently used; "b" is now the oldest.
+    store.find(keys[0])
+    response_b = store.db.execute("SELECT response FROM entries WHERE key = ?", (keys[1],)).fetchone()[0]
+
+    total = store.db.execute("SELECT SUM(size) FROM blobs").fetchone()[0]
+    store.max_bytes = total - 1
+    store.commit()
+    remaining = {row[0] for row in store.db.execute("SELECT key FROM entries")}
+    assert remaining == {keys[0], keys[2]}
+    assert not os.path.exists(store._blob_path(response_b))
+    assert store.read_blob(response_b) is None
+    store.close()
+
+
+def test_sink_stores_off_the_result_path(tmp_path):
+    sink = ResponseStoreSink(ResponseStore(str(tmp_path)), build="v1")
+    results = [
+        {"status": "success", "request": request("a"), "response": "one", "completion_tokens": 1,
+         "total_time": 0.1, "time_to_first_token": 0.05},
+        {"status": "success", "request": request("a"), "response": "one", "completion_tokens": 1,
+         "total_time": 0.1, "time_to_first_token": 0.05},
+        {"status": "error", "request": request("b"), "response": None},
+    ]
+    for result in results:
+        sink.add(result)
+    sink.close()
+
+    assert all('request' not in result and 'response' not in result for result in results)
+    assert results[0]['response_key'] == request_key(request("a"))
+    assert 'response_key' not in results[2]
+    assert sink.counts == {"new": 1, "unchanged": 1}
+
+
+def test_report_notes_sampling_when_responses_vary_within_a_build(tmp_path):
+    store = ResponseStore(str(tmp_path))
+    store.put(request("a"), "one", "v1")
+    sink = ResponseStoreSink(store, build="v2")
+    for response in ("two", "three"):
+        sink.add({"status": "success", "request": request("a"), "response": response})
+    sink.close()
+
+    assert sink.counts == {"changed": 1, "varied": 1}
+    assert "sampling noise" in sink.format_report()
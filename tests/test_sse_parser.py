@@ -0,0 +1,64 @@
+import json
+import random
+
+from sse_parser import ChatStreamParser
+
+CONTENTS = ["Hello", ", ", "wor\"ld", "", "!\n", "ünïcode ✓"]
+USAGE = {"prompt_tokens": 7, "completion_tokens": 5, "total_tokens": 12}
+
+
+def make_stream():
+    events = [{"choices": [{"delta": {"role": "assistant"}}]}]
+    events += [{"choices": [{"delta": {"content": content}}]} for content in CONTENTS]
+    events.append({"choices": [], "usage": USAGE})
+    body = b"".join(b"data: " + json.dumps(event).encode() + b"\r\n\r\n" for event in events)
+    return body + b"data: [DONE]\n\n"
+
+
+def split_randomly(data, rng):
+    pieces, start = [], 0
+    while start < len(data):
+        end = start + rng.randint(1, 40)
+        pieces.append(data[start:end])
+        start = end
+    return pieces
+
+
+def parse(pieces, capture):
+    parser = ChatStreamParser(capture=capture)
+    done = False
+    for index, piece in enumerate(pieces):
+        done = parser.feed(piece, float(index))
+        if done:
+            break
+    else:
+        parser.close(float(len(pieces)))
+    return parser, done
+
+
+def test_any_split_gives_the_same_result():
+    stream = make_stream()
+    expected_text = "".join(CONTENTS)
+    expected_chunks = sum(1 for content in CONTENTS if content)
+    rng = random.Random(3)
+    splits = [[stream], [stream[i:i + 1] for i in range(len(stream))]]
+    splits += [split_randomly(stream, rng) for _ in range(50)]
+
+    for pieces in splits:
+        for capture in (True, False):
+            parser, done = parse(pieces, capture)
+            assert done
+            assert parser.chunk_count == expected_chunks
+            assert len(parser.chunk_times) == expected_chunks
+            assert list(parser.chunk_times) == sorted(parser.chunk_times)
+            assert parser.usage == USAGE
+            assert parser.text() == (expected_text if capture else "")
+
+
+def test_multi_line_data_event_and_missing_final_blank_line():
+    payload = json.dumps({"choices": [{"delta": {"content": "split"}}]}, indent=1).encode()
+    stream = b"".join(b"data: " + line + b"\n" for line in payload.split(b"\n"))
+    parser, done = parse([stream], capture=True)
+    assert not done
+    assert parser.chunk_count == 1
+    assert parser.text() == "split"
@@ -0,0 +1,31 @@
+from telemetry import TimeSeries
+
+
+def result(start_time, total_time=0.5, ttft=0.1, status="success"):
+    return {"status": status, "start_time": start_time, "total_time": total_time,
+            "time_to_first_token": ttft, "completion_tokens": 10}
+
+
+def test_buckets_by_finish_time(tmp_path):
+    series = TimeSeries(str(tmp_path / "series.csv"), interval=1.0)
+    series.add(result(series.origin + 0.1))
+    series.add(result(series.origin + 0.2, total_time=1.0))
+    series.add(result(series.origin + 1.5, total_time=0.1, status="error"))
+    series.close()
+
+    rows = (tmp_path / "series.csv").read_text().splitlines()
+    header = rows[0].split(",")
+    first, second = (dict(zip(header, row.split(","))) for row in rows[1:])
+    assert (first["requests"], first["errors"], first["est_concurrency"]) == ("1", "0", "0.50")
+    assert (second["requests"], second["errors"], second["est_concurrency"]) == ("2", "1", "1.00")
+
+
+def test_openmetrics_before_and_after_the_first_bucket():
+    series = TimeSeries(interval=1.0)
+    text = series.format_openmetrics()
+    assert 'benchmark_time_to_first_token_seconds{p="50"} NaN' in text
+    assert "quantile" not in text and text.endswith("# EOF\n")
+
+    series.add(result(series.origin))
+    series.tick(series.origin + 10)
+    assert 'benchmark_time_to_first_token_seconds{p="99"} 0.1' in series.format_openmetrics()
@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from workload import (CONVERSATION_CATEGORY, SHARED_PREFIX_CATEGORY, iter_prefix_plan, iter_synthetic_plan,
+                      parse_distribution, request_messages)
+
+
+@pytest.mark.parametrize("spec", [
+    "fixed:0", "fixed:x", "uniform:0:5", "uniform:9:3", "uniform:5", "lognormal:0:1", "lognormal:100:-1",
+    "empirical:0=1", "empirical:5=-1", "empirical:5=0,6=0", "gamma:1:2", "",
+])
+def test_invalid_distributions_are_rejected(spec):
+    with pytest.raises(ValueError, match="Invalid length distribution"):
+        parse_distribution(spec)
+
+
+def test_samples_stay_in_range():
+    rng = random.Random(1)
+    assert {parse_distribution("fixed:7")(rng) for _ in range(10)} == {7}
+    assert {parse_distribution("uniform:3:5")(rng) for _ in range(200)} == {3, 4, 5}
+    assert min(parse_distribution("lognormal:2:3")(rng) for _ in range(200)) >= 1
+    assert {parse_distribution("empirical:10=1,20=0,30=1")(rng) for _ in range(200)} == {10, 30}
+
+
+def test_empirical_distribution_from_a_file(tmp_path):
+    path = tmp_path / "lengths.txt"
+    path.write_text("128 3\n\n512 1\n")
+    rng = random.Random(2)
+    assert {parse_distribution(f"empirical:{path}")(rng) for _ in range(100)} == {128, 512}
+
+
+def test_synthetic_plan_is_determined_by_the_seed():
+    def plan(seed):
+        return list(iter_synthetic_plan(20, parse_distribution("uniform:10:100"),
+                                        parse_distribution("lognormal:64:0.5"), seed))
+
+    assert plan(3) == plan(3)
+    assert plan(3) != plan(4)
+    assert [request_messages(request) for _, _, request in plan(3)] == \
+           [request_messages(request) for _, _, request in plan(3)]
+    assert [request_num for _, request_num, _ in plan(3)] == list(range(1, 21))
+
+
+def prefix_plan(seed, num_requests=300, hit_ratio=0.8, turns=3, spacing=4):
+    return list(iter_prefix_plan(num_requests, 512, parse_distribution("uniform:10:50"),
+                                 parse_distribution("fixed:16"), hit_ratio, turns, seed, spacing))
+
+
+def test_prefix_plan_is_determined_by_the_seed():
+    assert prefix_plan(5) == prefix_plan(5)
+    assert prefix_plan(5) != prefix_plan(6)
+    assert [request_num for _, request_num, _ in prefix_plan(5)] == list(range(1, 301))
+
+
+def test_prefix_plan_reuses_prefixes_and_grows_conversations():
+    plan = prefix_plan(7)
+    first_turns = [request for category, _, request in plan if category != CONVERSATION_CATEGORY]
+    assert len(first_turns) == 100
+    shared = [request for category, _, request in plan if category == SHARED_PREFIX_CATEGORY]
+    assert 0.65 < len(shared) / len(first_turns) < 0.95
+    sent = set()
+    for category, _, request in plan:
+        if category == SHARED_PREFIX_CATEGORY:
+            assert request['prefix'] in sent
+        sent.add(request['prefix'])
+    # Each follow-up turn resends the conversation so far.
+    assert [len(request['history']) for _, _, request in plan[:12]] == [0] * 4 + [1] * 4 + [2] * 4
+    messages = request_messages(plan[8][2])
+    assert [m['role'] for m in messages] == ["system", "user", "assistant", "user", "assistant", "user"]
@@ -0,0 +1,58 @@
+"""
+Token accounting for the benchmark scripts.
+
+Counts come from the server's `usage` block when it is streamed back
+(requested through `stream_options.include_usage`). When a server omits it,
+a local tokenizer file is used instead, and only when neither is available
+does the count fall back to an estimate: the number of streamed content
+chunks, or for a response that arrives whole, its length in characters.
+"""
+from functools import lru_cache
+
+# Characters per token assumed when estimating the tokens of a whole
+# response (typical of BPE vocabularies on English text).
+CHARS_PER_TOKEN = 4
+
+try:
+    # Optional: pip install tokenizers
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+
+@lru_cache(maxsize=None)
+def load_tokenizer(tokenizer_path):
+    """
+    Loads a Hugging Face `tokenizer.json` from disk. The file is read once
+    per process and never fetched over the network.
+    """
+    if Tokenizer is None:
+        raise RuntimeError("Counting tokens locally needs the 'tokenizers' package: pip install tokenizers")
+    return Tokenizer.from_file(tokenizer_path)
+
+
+def count_tokens(text, tokenizer_path):
+    """Returns the number of tokens in `text`, or None without a tokenizer."""
+    if not tokenizer_path:
+        return None
+    return len(load_tokenizer(tokenizer_path).encode(text, add_special_tokens=False).ids)
+
+
+def estimate_tokens(text):
+    """Estimates the tokens in `text` from its length, for responses that were not streamed."""
+    return max(1, round(len(text) / CHARS_PER_TOKEN)) if text else 0
+
+
+def resolve_token_counts(usage, get_prompt_text, response_text, chunk_count, tokenizer_path=None):
+    """
+    Picks the most accurate prompt and completion token counts available.
+    Returns (prompt_tokens, completion_tokens, source), where source is
+    "usage", "tokenizer" or "chunks". prompt_tokens is None when only chunk
+    counting is possible. `get_prompt_text` returns the prompt's text; it is
+    only called when the tokenizer has to count it.
+    """
+    if usage and usage.get('completion_tokens') is not None:
+        return usage.get('prompt_tokens'), usage['completion_tokens'], "usage"
+    if tokenizer_path:
+        return count_tokens(get_prompt_text(), tokenizer_path), count_tokens(response_text, tokenizer_path), "tokenizer"
+    return None, chunk_count, "chunks"
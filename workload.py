@@ -0,0 +1,211 @@
+"""
+Request workloads beyond the built-in CATEGORIZED_PROMPTS.
+
+A workload yields request entries that summary_benchmark.send_request can
+send. An entry is either a plain prompt string or a dict with its own
+`max_tokens` and either `messages` or a synthetic `input_tokens` length,
+optionally behind a shared `prefix` and a conversation `history`.
+"""
+import json
+import math
+import os
+import random
+from datetime import datetime
+
+# Category assigned to trace records that do not name one.
+TRACE_CATEGORY = "trace"
+
+# Category assigned to generated requests.
+SYNTHETIC_CATEGORY = "synthetic"
+
+# Categories of the prefix-cache workload: the first request of a prefix
+# family is cold, later families reuse an already-sent prefix, and follow-up
+# turns resend the whole conversation so far.
+COLD_PREFIX_CATEGORY = "cold_prefix"
+SHARED_PREFIX_CATEGORY = "shared_prefix"
+CONVERSATION_CATEGORY = "conversation_turn"
+
+# Common English words that are a single token (with their leading space) in
+# the usual BPE vocabularies, so a synthetic prompt of N words is close to N
+# input tokens.
+SYNTHETIC_WORDS = (
+    "the of and to in is that for it as was with be by on not he this are or his from at which "
+    "but have an they you were her she there one all we their has been if more when will would "
+    "who so no time people year way day man thing woman life child world school state family "
+    "student group country problem hand part place case week company system program question work "
+    "government number night point home water room mother area money story fact month lot right "
+    "study book eye job word business issue side kind head house service friend father power hour "
+    "game line end member law car city community name president team minute idea kid body "
+    "information back parent face others level office door health person art war history party "
+    "result change morning reason research girl guy moment air teacher force education"
+).split()
+
+
+def parse_timestamp(value):
+    """Converts a trace timestamp (epoch seconds or ISO 8601 string) to epoch seconds."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def iter_trace(path):
+    """Reads a JSONL trace one record at a time, skipping blank lines."""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_trace_schedule(path, time_scale=1.0):
+    """
+    Yields (offset, category, request_num, request) for every record of a
+    `{timestamp, messages, max_tokens, category}` trace. Offsets are the
+    original inter-arrival times divided by `time_scale`, so 2.0 replays the
+    trace twice as fast. Records must be in timestamp order; late ones are
+    sent immediately.
+    """
+    first_timestamp = None
+    for request_num, record in enumerate(iter_trace(path), 1):
+        timestamp = parse_timestamp(record['timestamp'])
+        if first_timestamp is None:
+            first_timestamp = timestamp
+        request = {"messages": record.get('messages') or [{"role": "user", "content": record['prompt']}]}
+        if record.get('max_tokens') is not None:
+            request['max_tokens'] = record['max_tokens']
+        yield (timestamp - first_timestamp) / time_scale, record.get('category', TRACE_CATEGORY), request_num, request
+
+
+def parse_distribution(spec):
+    """
+    Parses a length distribution and returns a sampler taking a
+    random.Random and returning a positive int. Accepted forms:
+      fixed:N
+      uniform:LOW:HIGH
+      lognormal:MEDIAN:SIGMA     (SIGMA of the underlying normal)
+      empirical:V=W,V=W,...      (value=weight pairs)
+      empirical:PATH             (a file of "value weight" lines)
+    """
+    kind, _, args = spec.partition(":")
+    try:
+        if kind == "fixed":
+            value = int(args)
+            if value < 1:
+                raise ValueError(f"Invalid length distribution: '{spec}' (the length must be positive)")
+            return lambda rng: value
+        if kind == "uniform":
+            low, high = (int(x) for x in args.split(":"))
+            if not 0 < low <= high:
+                raise ValueError(f"Invalid length distribution: '{spec}' (needs 0 < LOW <= HIGH)")
+            return lambda rng: rng.randint(low, high)
+        if kind == "lognormal":
+            median, sigma = (float(x) for x in args.split(":"))
+            if median <= 0 or sigma < 0:
+                raise ValueError(f"Invalid length distribution: '{spec}' (needs MEDIAN > 0 and SIGMA >= 0)")
+            mu = math.log(median)
+            return lambda rng: max(1, round(rng.lognormvariate(mu, sigma)))
+        if kind == "empirical":
+            if os.path.exists(args):
+                with open(args) as f:
+                    pairs = [line.split() for line in f if line.strip()]
+            else:
+                pairs = [pair.split("=") for pair in args.split(",")]
+            values = [int(value) for value, _ in pairs]
+            weights = [float(weight) for _, weight in pairs]
+            if min(values) < 1 or min(weights) < 0 or sum(weights) <= 0:
+                raise ValueError(f"Invalid length distribution: '{spec}' "
+                                 f"(values must be positive and weights non-negative, not all zero)")
+            return lambda rng: rng.choices(values, weights)[0]
+    except ValueError as e:
+        if str(e).startswith("Invalid length distribution"):
+            raise
+    raise ValueError(f"Invalid length distribution: '{spec}'")
+
+
+def iter_synthetic_plan(num_requests, input_lengths, output_lengths, seed):
+    """
+    Yields (category, request_num, request) for `num_requests` generated
+    requests whose input length and max_tokens are drawn from the two
+    samplers returned by parse_distribution. The same seed always yields the
+    same requests. The prompt text itself is only built when the request is
+    sent.
+    """
+    rng = random.Random(seed)
+    for request_num in range(1, num_requests + 1):
+        yield SYNTHETIC_CATEGORY, request_num, {
+            "input_tokens": input_lengths(rng),
+            "max_tokens": output_lengths(rng),
+            "seed": rng.getrandbits(32),
+        }
+
+
+def iter_prefix_plan(num_requests, prefix_tokens, input_lengths, output_lengths, hit_ratio, turns, seed, spacing=1):
+    """
+    Yields (category, request_num, request) for a prefix-cache workload.
+    Each conversation opens with a `prefix_tokens` system prompt that, with
+    probability `hit_ratio`, is shared with an earlier conversation, then
+    runs `turns` user turns whose history grows with every turn. Suffix
+    lengths and max_tokens are drawn from the two samplers. Only the first
+    conversation is always cold, so the reuse achieved stays close to
+    `hit_ratio` at any concurrency. Conversations are interleaved `spacing`
+    at a time (use the concurrency); past the first group, a request is
+    normally sent after the one whose prefix it reuses has finished.
+    """
+    rng = random.Random(seed)
+    families = []
+    request_num = 0
+    while request_num < num_requests:
+        conversations = []
+        for _ in range(min(spacing, math.ceil((num_requests - request_num) / turns))):
+            if families and rng.random() < hit_ratio:
+                category, family = SHARED_PREFIX_CATEGORY, rng.choice(families)
+            else:
+                category, family = COLD_PREFIX_CATEGORY, rng.getrandbits(32)
+                families.append(family)
+            conversations.append((category, family, []))
+
+        for turn in range(turns):
+            for category, family, history in conversations:
+                if request_num == num_requests:
+                    return
+                request_num += 1
+                request = {
+                    "prefix": (prefix_tokens, family),
+                    "history": tuple(history),
+                    "input_tokens": input_lengths(rng),
+                    "max_tokens": output_lengths(rng),
+                    "seed": rng.getrandbits(32),
+                }
+                yield category if turn == 0 else CONVERSATION_CATEGORY, request_num, request
+                history.append((request['input_tokens'], request['seed'], request['max_tokens']))
+
+
+def synthetic_prompt(input_tokens, seed):
+    """Builds a prompt of roughly `input_tokens` tokens from SYNTHETIC_WORDS."""
+    rng = random.Random(seed)
+    return " ".join(rng.choices(SYNTHETIC_WORDS, k=input_tokens))
+
+
+def request_messages(request):
+    """Returns the chat messages for a request entry."""
+    if isinstance(request, str):
+        return [{"role": "user", "content": request}]
+    if 'messages' in request:
+        return request['messages']
+    messages = []
+    prefix_tokens, prefix_seed = request.get('prefix', (0, None))
+    if prefix_tokens:
+        messages.append({"role": "system", "content": synthetic_prompt(prefix_tokens, prefix_seed)})
+    # Earlier turns get a stand-in reply as long as that turn's max_tokens.
+    for input_tokens, seed, reply_tokens in request.get('history', ()):
+        messages.append({"role": "user", "content": synthetic_prompt(input_tokens, seed)})
+        messages.append({"role": "assistant", "content": synthetic_prompt(reply_tokens, seed + 1)})
+    messages.append({"role": "user", "content": synthetic_prompt(request['input_tokens'], request['seed'])})
+    return messages
+
+
+def request_text(request):
+    """Returns the text content of a request entry, for local token counting."""
+    if isinstance(request, str):
+        return request
+    return "\n".join(m['content'] for m in request_messages(request) if isinstance(m.get('content'), str))